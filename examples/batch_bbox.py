@@ -9,7 +9,12 @@ native_bbox = \
 latlon_bbox = ['-103.877', '44.371', '-103.622', '44.5', 'EPSG:4326']
 
 sf = cat.get_workspace('sf')
-for rs in cat.get_resources(workspace=sf):
+resources = cat.get_resources(workspace=sf)
+for rs in resources:
     rs.native_bbox = native_bbox
     rs.latlon_bbox = latlon_bbox
-    cat.save(rs)
+
+for result in cat.save_all(resources):
+    if not result.success:
+        print "Failed to save %s (%s): %s" % (
+            result.obj.name, result.status, result.error)
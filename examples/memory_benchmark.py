@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Memory use of catalog objects as made for listings (get_layers() and the
+like: named, but never fetched or modified.)  For each class and count,
+builds that many objects in a fresh interpreter and reports bytes per
+object two ways: "own", the sizes of the object and of everything it alone
+holds on to (its name and any dicts), which is exact and the same from run
+to run, and "rss", the growth of the process's resident memory, which
+includes the allocator's overhead.  No GeoServer is needed.
+
+    python examples/memory_benchmark.py [count ...]
+"""
+import gc
+import os
+import resource
+import subprocess
+import sys
+
+from geoserver.catalog import Catalog
+from geoserver.layer import Layer
+from geoserver.layergroup import LayerGroup
+from geoserver.resource import Coverage, FeatureType
+from geoserver.store import CoverageStore, DataStore
+from geoserver.style import Style
+from geoserver.workspace import Workspace
+
+COUNTS = [10000, 100000, 1000000]
+
+CLASSES = ["FeatureType", "Coverage", "Layer", "Style", "DataStore",
+        "CoverageStore", "Workspace", "LayerGroup"]
+
+def factory(cls, catalog):
+    ws = Workspace(catalog, "topp")
+    if cls in ("FeatureType", "Coverage"):
+        store = DataStore(catalog, ws, "store")
+        kind = FeatureType if cls == "FeatureType" else Coverage
+        return lambda name: kind(catalog, ws, store, name)
+    elif cls in ("DataStore", "CoverageStore"):
+        kind = DataStore if cls == "DataStore" else CoverageStore
+        return lambda name: kind(catalog, ws, name)
+    kind = dict(Layer=Layer, Style=Style, Workspace=Workspace,
+            LayerGroup=LayerGroup)[cls]
+    return lambda name: kind(catalog, name)
+
+def own_size(obj):
+    size = sys.getsizeof(obj)
+    if hasattr(obj, "__dict__"):
+        size += sys.getsizeof(obj.__dict__)
+    size += sys.getsizeof(obj.name)
+    for held in (obj._dirty, obj._nodes, obj._values):
+        if held is not None:
+            size += sys.getsizeof(held)
+    return size
+
+def resident():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except IOError:
+        # peak rather than current, in kilobytes (bytes on OS X)
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+def measure(cls, count):
+    make = factory(cls, Catalog("http://localhost:8080/geoserver/rest"))
+    names = ["%s%07d" % (cls.lower(), i) for i in xrange(count)]
+    gc.collect()
+    before = resident()
+    objects = [make(name) for name in names]
+    gc.collect()
+    grown = resident() - before - sys.getsizeof(objects)
+    # the names were there before; count them as the objects' own
+    own = sum(own_size(obj) for obj in objects)
+    return own / float(count), (grown + sum(map(sys.getsizeof, names))) / float(count)
+
+def main(counts):
+    print "%-14s %9s %10s %10s" % ("class", "count", "own B/obj", "rss B/obj")
+    for cls in CLASSES:
+        for count in counts:
+            # each in its own interpreter, so one run's freed memory doesn't
+            # flatter the next
+            out = subprocess.check_output([sys.executable, __file__,
+                "--one", cls, str(count)])
+            own, rss = map(float, out.split())
+            print "%-14s %9d %10.1f %10.1f" % (cls, count, own, rss)
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--one"]:
+        print "%f %f" % measure(sys.argv[2], int(sys.argv[3]))
+    else:
+        main([int(n) for n in sys.argv[1:]] or COUNTS)
@@ -0,0 +1,103 @@
+from geoserver.catalog import Catalog
+from multiprocessing.pool import ThreadPool
+
+DEFAULT_CONCURRENCY = 16
+"""
+How many catalog calls an AsyncCatalog runs at once unless told otherwise.
+"""
+
+_deferred_methods = [
+    "get_xml", "save", "save_all", "delete", "changeset",
+    "get_workspaces", "get_workspace", "get_default_workspace",
+    "create_workspace", "reassign_workspace",
+    "get_stores", "get_store", "create_datastore", "create_coveragestore2",
+    "create_featurestore", "create_coveragestore", "add_data_to_store",
+    "get_resources", "get_resource",
+    "get_layers", "get_layer",
+    "get_layergroups", "get_layergroup", "create_layergroup",
+    "get_styles", "get_style", "create_style",
+    "snapshot"
+]
+
+def _deferred(name):
+    def method(self, *args, **kwargs):
+        return self.submit(getattr(self.catalog, name), *args, **kwargs)
+    method.__name__ = name
+    method.__doc__ = "Like Catalog.%s, but returns an AsyncResult." % name
+    return method
+
+def gather(results, timeout=None):
+    """
+    Wait for a sequence of AsyncResults and return their values in the same
+    order.  The first failure is re-raised.
+    """
+    return [r.get(timeout) for r in results]
+
+class AsyncCatalog(object):
+    """
+    A non-blocking front for a Catalog.  Each of the catalog's methods is
+    mirrored by one that runs the call on a pool of at most concurrency
+    worker threads and immediately returns an AsyncResult (see
+    multiprocessing.pool); its get() waits for and returns the value, or
+    raises whatever the call raised.  Many lookups can be started at once
+    and collected with gather():
+
+        acat = AsyncCatalog("http://localhost:8080/geoserver/rest")
+        pending = [acat.get_resource(name) for name in names]
+        resources = gather(pending)
+
+    The objects that come back are the usual ResourceInfo subclasses bound
+    to the wrapped catalog, so reading their properties may still block on
+    a fetch; use fetch() to load them in the background first.  Writes go
+    through the catalog's own save and message() serialization.
+    """
+    def __init__(self, catalog, *args, **kwargs):
+        self.concurrency = kwargs.pop("concurrency", DEFAULT_CONCURRENCY)
+        if isinstance(catalog, basestring):
+            catalog = Catalog(catalog, *args, **kwargs)
+        self.catalog = catalog
+        self._pool = ThreadPool(self.concurrency)
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Run any callable on the pool, returning an AsyncResult for it.
+        """
+        return self._pool.apply_async(function, args, kwargs)
+
+    def fetch(self, obj):
+        """
+        Fetch a catalog object's document in the background; the result is
+        the object itself, ready for its properties to be read.
+        """
+        def fetch():
+            if obj.dom is None:
+                obj.fetch()
+            return obj
+        return self.submit(fetch)
+
+    def map(self, name, args):
+        """
+        Call the named catalog method once for each item of args (a tuple
+        of arguments, or a single argument), returning a list of
+        AsyncResults in the same order.
+        """
+        method = getattr(self, name)
+        return [method(*a) if isinstance(a, tuple) else method(a) for a in args]
+
+    def close(self):
+        """
+        Stop accepting calls, wait for the ones in progress to finish, and
+        close the catalog.
+        """
+        self._pool.close()
+        self._pool.join()
+        self.catalog.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+for _name in _deferred_methods:
+    setattr(AsyncCatalog, _name, _deferred(_name))
@@ -0,0 +1,302 @@
+"""
+Streaming upload bundles.  GeoServer takes multi-file formats such as
+Shapefile and WorldImage as ZIP archives; a BundleStream produces such an
+archive on the fly while it is being sent, reading each component a chunk
+at a time, so neither the archive nor any of its members is ever held in
+memory or written to disk in full.
+"""
+from hashlib import sha1
+import os
+import struct
+import time
+import zlib
+from zipfile import ZIP_DEFLATED, ZIP_STORED
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+"""
+How many bytes of each component file a BundleStream reads at a time.
+"""
+
+DEFAULT_SPOOL_SIZE = 8 * 1024 * 1024
+"""
+Bundles whose components add up to at most this many bytes are built in
+memory rather than streamed.
+"""
+
+VECTOR_COMPRESSION = dict((ext, ZIP_DEFLATED) for ext in
+        ("shp", "shx", "dbf", "prj", "cpg", "qix", "sbn", "sbx"))
+"""
+Compression modes by file extension that deflate the components of a
+Shapefile, which shrink well, to pass as the compression of a bundle.
+Bundle members are otherwise stored: rasters such as GeoTIFFs are large
+and often compressed already, so deflating them costs far more CPU time
+than it saves in transfer.
+"""
+
+_ZIP64_LIMIT = (1 << 31) - 1
+_MAX_32 = 0xFFFFFFFF
+
+_local_header = struct.Struct("<4s2B4HL2L2H")
+_data_descriptor = struct.Struct("<4sLLL")
+_data_descriptor64 = struct.Struct("<4sLQQ")
+_central_header = struct.Struct("<4s4B4HL2L5H2L")
+_end_record = struct.Struct("<4s4H2LH")
+_end_record64 = struct.Struct("<4sQ2H2L4Q")
+_end_locator64 = struct.Struct("<4sLQL")
+
+_DATA_DESCRIPTOR = 0x08
+
+def bundle_members(name, data, compression=None):
+    """
+    The (archive name, source, compression mode) triples for a basename and
+    a dict of extensions to paths or file-like objects, in a stable order.
+    compression maps extensions to ZIP_STORED or ZIP_DEFLATED (see
+    VECTOR_COMPRESSION); members it doesn't mention are stored.
+    """
+    modes = compression or {}
+    return [("%s.%s" % (name, ext), data[ext], modes.get(ext.lower(), ZIP_STORED))
+            for ext in sorted(data)]
+
+def bundle_size(data):
+    """
+    The total size in bytes of the components of a bundle, or None if some
+    of them can't be measured without reading them.
+    """
+    sizes = [_source_size(source) for source in data.values()]
+    return None if None in sizes else sum(sizes)
+
+def bundle_digest(data, params=(), chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    A hex digest of the contents of a dict of extensions to paths or
+    file-like objects, and of any params (such as a charset) that shape
+    what the upload does with them.  The components are read a chunk at a
+    time; file-like ones are sought back to where they were.  Returns None
+    if one of them can't be read twice.
+    """
+    digest = sha1(repr(sorted(params)))
+    for ext in sorted(data):
+        source = data[ext]
+        start = _tell(source)
+        if start is None:
+            return None
+        digest.update("\0%s\0" % ext)
+        stream = open(source, "rb") if isinstance(source, basestring) else source
+        try:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+        finally:
+            if stream is source:
+                source.seek(start)
+            else:
+                stream.close()
+    return digest.hexdigest()
+
+def _source_size(source):
+    # None when the size can't be told without reading the whole thing
+    if isinstance(source, basestring):
+        return os.path.getsize(source)
+    try:
+        return os.fstat(source.fileno()).st_size - source.tell()
+    except (AttributeError, IOError, OSError, ValueError):
+        return None
+
+def _tell(source):
+    # where a component starts, or None if it can't be read twice
+    if isinstance(source, basestring):
+        return 0
+    try:
+        return source.tell() if hasattr(source, "seek") else None
+    except (IOError, OSError, ValueError):
+        return None
+
+def _dos_time(timestamp):
+    t = time.localtime(timestamp)
+    return ((t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+            ((max(t.tm_year, 1980) - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday)
+
+class _Member(object):
+    def __init__(self, arcname, source, compress_type=ZIP_STORED):
+        self.arcname = arcname
+        self.source = source
+        self.compress_type = compress_type
+        size = _source_size(source)
+        # members whose size isn't known up front get zip64 headers, in case
+        self.zip64 = size is None or size >= _ZIP64_LIMIT
+        if isinstance(source, basestring):
+            self.dos_time = _dos_time(os.path.getmtime(source))
+        else:
+            self.dos_time = _dos_time(time.time())
+        self.crc = 0
+        self.compress_size = 0
+        self.file_size = 0
+        self.offset = 0
+
+    def local_header(self):
+        extra = ""
+        compress_size = file_size = 0
+        if self.zip64:
+            extra = struct.pack("<HHQQ", 1, 16, 0, 0)
+            compress_size = file_size = _MAX_32
+        return _local_header.pack("PK\003\004", 45 if self.zip64 else 20, 0,
+                _DATA_DESCRIPTOR, self.compress_type, self.dos_time[0], self.dos_time[1],
+                0, compress_size, file_size, len(self.arcname), len(extra)) + \
+            self.arcname + extra
+
+    def data_descriptor(self):
+        if self.zip64:
+            return _data_descriptor64.pack("PK\007\010", self.crc,
+                    self.compress_size, self.file_size)
+        return _data_descriptor.pack("PK\007\010", self.crc,
+                self.compress_size, self.file_size)
+
+    def central_header(self):
+        fields = []
+        file_size, compress_size, offset = self.file_size, self.compress_size, self.offset
+        if file_size >= _ZIP64_LIMIT or compress_size >= _ZIP64_LIMIT:
+            fields += [file_size, compress_size]
+            file_size = compress_size = _MAX_32
+        if offset >= _ZIP64_LIMIT:
+            fields.append(offset)
+            offset = _MAX_32
+        extra = ""
+        if fields:
+            extra = struct.pack("<HH%dQ" % len(fields), 1, 8 * len(fields), *fields)
+        version = 45 if (self.zip64 or fields) else 20
+        return _central_header.pack("PK\001\002", version, 3, version, 0,
+                _DATA_DESCRIPTOR, self.compress_type, self.dos_time[0], self.dos_time[1],
+                self.crc, compress_size, file_size, len(self.arcname), len(extra),
+                0, 0, 0, 0644 << 16, offset) + self.arcname + extra
+
+    def compressed(self, chunk_size):
+        if isinstance(self.source, basestring):
+            stream = open(self.source, "rb")
+        else:
+            stream = self.source
+        if self.compress_type == ZIP_STORED:
+            compressor = None
+        else:
+            compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        crc = 0
+        try:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                crc = zlib.crc32(chunk, crc)
+                self.file_size += len(chunk)
+                out = compressor.compress(chunk) if compressor else chunk
+                if out:
+                    self.compress_size += len(out)
+                    yield out
+        finally:
+            if stream is not self.source:
+                stream.close()
+        self.crc = crc & 0xFFFFFFFF
+        if compressor:
+            out = compressor.flush()
+            self.compress_size += len(out)
+            yield out
+
+def zip_chunks(members, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Generate a ZIP archive of (archive name, source, compression mode)
+    triples piece by piece.  Each source is a path or a file-like object and
+    is read chunk_size bytes at a time; since sizes and checksums are only
+    known once a member has been read, they follow its data in a data
+    descriptor (stored members included, which readers that go by the
+    central directory, as GeoServer's does, accept.)
+    """
+    written = 0
+    done = []
+    for arcname, source, compress_type in members:
+        member = _Member(arcname, source, compress_type)
+        member.offset = written
+        header = member.local_header()
+        written += len(header)
+        yield header
+        for piece in member.compressed(chunk_size):
+            written += len(piece)
+            yield piece
+        descriptor = member.data_descriptor()
+        written += len(descriptor)
+        yield descriptor
+        done.append(member)
+
+    directory_offset = written
+    directory = "".join(m.central_header() for m in done)
+    written += len(directory)
+    yield directory
+
+    count, size, offset = len(done), len(directory), directory_offset
+    if count >= 0xFFFF or size >= _ZIP64_LIMIT or offset >= _ZIP64_LIMIT:
+        yield _end_record64.pack("PK\006\006", 44, 45, 45, 0, 0,
+                count, count, size, offset)
+        yield _end_locator64.pack("PK\006\007", 0, written, 1)
+        count, size, offset = min(count, 0xFFFF), min(size, _MAX_32), min(offset, _MAX_32)
+    yield _end_record.pack("PK\005\006", 0, 0, count, count, size, offset, 0)
+
+class BundleStream(object):
+    """
+    A read-only file-like object producing the ZIP archive for a basename
+    and a dict of extensions to paths or file-like objects, as
+    prepare_upload_bundle would write it, while it is being read.  Memory
+    use is bounded by chunk_size whatever the size of the components.
+    compression chooses the compression mode by extension, as for
+    bundle_members.
+
+    rewind() starts the archive over, so it can be sent again; that needs
+    every file-like component to be seekable.
+    """
+    def __init__(self, name, data, chunk_size=DEFAULT_CHUNK_SIZE, compression=None):
+        self.name = name
+        self.chunk_size = chunk_size
+        self._members = bundle_members(name, data, compression)
+        self._starts = dict((arcname, _tell(source))
+                for arcname, source, mode in self._members)
+        self._start()
+
+    def _start(self):
+        self._pieces = (piece for piece in zip_chunks(self._members, self.chunk_size)
+                if piece)
+        self._buffer = ""
+
+    def rewind(self):
+        """
+        Start over from the beginning of the archive.  Returns False, and
+        does nothing, if a component can't be read again.
+        """
+        if None in self._starts.values():
+            return False
+        self._pieces.close()
+        for arcname, source, mode in self._members:
+            if not isinstance(source, basestring):
+                source.seek(self._starts[arcname])
+        self._start()
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data = self._buffer + "".join(self._pieces)
+            self._buffer = ""
+            return data
+        while len(self._buffer) < size:
+            try:
+                self._buffer += next(self._pieces)
+            except StopIteration:
+                break
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def __iter__(self):
+        if self._buffer:
+            yield self._buffer
+            self._buffer = ""
+        for piece in self._pieces:
+            yield piece
+
+    def close(self):
+        self._pieces.close()
+        self._buffer = ""
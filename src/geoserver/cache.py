@@ -0,0 +1,461 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from hashlib import sha1
+from itertools import count
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger("gsconfig.cache")
+
+DEFAULT_CACHE_SIZE = 32 * 1024 * 1024
+"""
+The default byte budget for a catalog's response cache.
+"""
+
+DEFAULT_STRIPES = 16
+"""
+How many independently locked stripes each part of the response cache is
+split into.
+"""
+
+DEFAULT_MAX_AGE = timedelta(seconds=5)
+"""
+How long a cached response is used before it is revalidated with the server,
+unless a cache policy says otherwise.
+"""
+
+WORKSPACES = "workspaces"
+STORES = "stores"
+RESOURCES = "resources"
+LAYERS = "layers"
+LAYERGROUPS = "layergroups"
+STYLES = "styles"
+SLD = "sld"
+OTHER = "other"
+"""
+The classes of url that a CachePolicy can configure separately: the workspace
+index and workspace documents, store listings and documents, featuretype and
+coverage listings and documents, the layer index and layer documents, the
+layergroup index and documents, the style index and documents, SLD bodies,
+and anything else.
+"""
+
+_url_classes = [
+    (SLD, re.compile(r"/styles/[^/]+\.sld$")),
+    (STYLES, re.compile(r"/styles(/[^/]+)?\.xml$")),
+    (LAYERGROUPS, re.compile(r"/layergroups(/[^/]+)?\.xml$")),
+    (LAYERS, re.compile(r"/layers(/[^/]+)?\.xml$")),
+    (RESOURCES, re.compile(r"/(featuretypes|coverages)(/[^/]+)?\.xml$")),
+    (STORES, re.compile(r"/(datastores|coveragestores)(/[^/]+)?\.xml$")),
+    (WORKSPACES, re.compile(r"/workspaces(/[^/]+)?\.xml$"))
+]
+
+def url_class(url):
+    """
+    Work out which of the url classes above a REST url belongs to.
+    """
+    for name, pattern in _url_classes:
+        if pattern.search(url):
+            return name
+    return OTHER
+
+class CachedResponse(object):
+    """
+    A GET response held by the cache: the raw body as it came off the wire,
+    together with the element tree parsed from it.  The tree is shared by
+    every caller that hits this entry, so it must be treated as read-only.
+
+    The entry also remembers the validators the server sent (ETag and
+    Last-Modified) and a digest of the body, so a stale entry can be
+    revalidated, and an unchanged body recognized, without parsing it again.
+    """
+    def __init__(self, content, tree, etag=None, last_modified=None,
+            timestamp=None):
+        self.content = content
+        self.tree = tree
+        self.etag = etag
+        self.last_modified = last_modified
+        self.digest = sha1(content).digest()
+        self.timestamp = timestamp if timestamp is not None else datetime.now()
+
+    @property
+    def size(self):
+        return len(self.content)
+
+    def conditional_headers(self):
+        """
+        The headers that ask the server to answer 304 Not Modified if this
+        entry is still current.
+        """
+        headers = dict()
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def revalidated(self, etag=None, last_modified=None):
+        """
+        A fresh copy of this entry, for a response the server confirmed (or
+        that hashed the same) as the cached one.
+        """
+        return CachedResponse(self.content, self.tree,
+                etag or self.etag, last_modified or self.last_modified)
+
+class CacheRule(object):
+    """
+    How responses of one class of url are cached: how long they are used
+    before being revalidated, and how many bytes of them may be held.  A
+    max_bytes of 0 disables caching for the class altogether.  max_age may
+    be given as a timedelta or as a number of seconds.
+    """
+    def __init__(self, max_age=DEFAULT_MAX_AGE, max_bytes=DEFAULT_CACHE_SIZE):
+        if not isinstance(max_age, timedelta):
+            max_age = timedelta(seconds=max_age)
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def __repr__(self):
+        return "CacheRule(max_age=%r, max_bytes=%r)" % (self.max_age, self.max_bytes)
+
+NO_CACHE = CacheRule(max_age=0, max_bytes=0)
+"""
+A rule for url classes that should never be cached.
+"""
+
+class CachePolicy(object):
+    """
+    Maps url classes to the CacheRule used for them.  Classes without a rule
+    of their own fall back to the default rule, and share a single byte
+    budget; a class with its own rule gets a budget of its own.  A policy
+    holds no cached data, so one instance can be shared by any number of
+    catalogs:
+
+        policy = CachePolicy(workspaces=CacheRule(max_age=600),
+                             styles=CacheRule(max_age=600),
+                             sld=NO_CACHE)
+        cat = Catalog(url, cache_policy=policy)
+    """
+    def __init__(self, default=None, **rules):
+        for name in rules:
+            if name not in dict(_url_classes) and name != OTHER:
+                raise ValueError("Unknown url class for cache policy: %s" % name)
+        self.default = default if default is not None else CacheRule()
+        self.rules = rules
+
+    def rule(self, name):
+        return self.rules.get(name, self.default)
+
+    def __repr__(self):
+        return "CachePolicy(default=%r, %s)" % (self.default,
+                ", ".join("%s=%r" % kv for kv in sorted(self.rules.items())))
+
+class _Stripe(object):
+    """
+    One stripe of a _Segment: a share of its entries, the recency order of
+    those entries, and the lock that guards changes to them.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = dict()
+        self.recency = OrderedDict()
+
+class _Segment(object):
+    """
+    A least-recently-used map of urls to cached responses, bounded by the
+    total size of the raw response bodies it holds.  Parsed trees take more
+    memory than the text they came from, but grow in proportion to it, so
+    the body size is a workable proxy for the real footprint.
+
+    Entries are spread over several stripes by url, each with a lock of its
+    own, so writers only contend with writers that hash to the same stripe.
+    Readers take no lock at all: a lookup is a single dict read, and the
+    entry is only marked as recently used if its stripe's lock happens to
+    be free.  Eviction picks the least recently used entry across all
+    stripes.
+    """
+    def __init__(self, max_bytes, stripes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.stripes = [_Stripe() for i in range(max(stripes, 1))]
+        self._size_lock = threading.Lock()
+        self._ticks = count()
+
+    def _stripe(self, url):
+        return self.stripes[hash(url) % len(self.stripes)]
+
+    def get(self, url):
+        stripe = self._stripe(url)
+        entry = stripe.entries.get(url)
+        if entry is not None and stripe.lock.acquire(False):
+            try:
+                if url in stripe.recency:
+                    del stripe.recency[url]
+                    stripe.recency[url] = next(self._ticks)
+            finally:
+                stripe.lock.release()
+        return entry
+
+    def put(self, url, entry, still_valid=lambda: True):
+        if self.max_bytes <= 0 or entry.size > self.max_bytes:
+            logger.debug("not caching %s (%d bytes)", url, entry.size)
+            self.discard(url)
+            return
+        stripe = self._stripe(url)
+        with stripe.lock:
+            if not still_valid():
+                return
+            old = stripe.entries.get(url)
+            stripe.entries[url] = entry
+            stripe.recency.pop(url, None)
+            stripe.recency[url] = next(self._ticks)
+        self._grow(entry.size - (old.size if old is not None else 0))
+        self._shrink()
+
+    def discard(self, url):
+        stripe = self._stripe(url)
+        with stripe.lock:
+            self._discard(stripe, url)
+
+    def _discard(self, stripe, url):
+        # caller holds stripe.lock
+        entry = stripe.entries.pop(url, None)
+        if entry is not None:
+            del stripe.recency[url]
+            self._grow(-entry.size)
+
+    def _grow(self, delta):
+        with self._size_lock:
+            self.size += delta
+
+    def _shrink(self):
+        # evict from one stripe at a time, so this never holds two stripe
+        # locks at once and can't deadlock against another writer
+        while self.size > self.max_bytes:
+            oldest = None
+            for stripe in self.stripes:
+                with stripe.lock:
+                    if stripe.recency:
+                        url, tick = next(stripe.recency.iteritems())
+                        if oldest is None or tick < oldest[2]:
+                            oldest = (stripe, url, tick)
+            if oldest is None:
+                return
+            stripe, url, tick = oldest
+            with stripe.lock:
+                self._discard(stripe, url)
+            logger.debug("evicted %s from cache", url)
+
+    def __len__(self):
+        return sum(len(s.entries) for s in self.stripes)
+
+    def __contains__(self, url):
+        return url in self._stripe(url).entries
+
+class DiskCache(object):
+    """
+    A persistent store of response bodies and their validators, kept in a
+    single SQLite file so that short-lived processes can start from what an
+    earlier run already downloaded.  Entries loaded from disk are always
+    revalidated with the server before use, so a stale file costs a round of
+    conditional GETs rather than wrong answers.
+
+    SQLite takes care of locking, so several processes (and threads; each
+    thread gets a connection of its own) may share one file.  Responses are
+    keyed by url only, so catalogs that log in as users with different
+    permissions should not share a file.
+    """
+    def __init__(self, path, timeout=30):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS responses ("
+                         "url TEXT PRIMARY KEY, content BLOB, etag TEXT, "
+                         "last_modified TEXT, stored REAL)")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            try:
+                # lets readers in other processes carry on during writes
+                conn.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.DatabaseError, e:
+                logger.debug("could not enable WAL for %s: %s", self.path, e)
+            self._local.conn = conn
+        return conn
+
+    def get(self, url):
+        row = self._connection().execute(
+            "SELECT content, etag, last_modified FROM responses WHERE url = ?",
+            (url,)).fetchone()
+        if row is None:
+            return None
+        content, etag, last_modified = row
+        return CachedResponse(str(content), None, etag, last_modified)
+
+    def put(self, url, entry):
+        with self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (url, buffer(entry.content), entry.etag, entry.last_modified,
+                 time.time()))
+
+    def invalidate(self, urls=(), prefixes=()):
+        with self._connection() as conn:
+            conn.executemany("DELETE FROM responses WHERE url = ?",
+                [(url,) for url in urls])
+            conn.executemany("DELETE FROM responses WHERE substr(url, 1, ?) = ?",
+                [(len(prefix), prefix) for prefix in prefixes])
+
+    def clear(self):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM responses")
+
+class ResponseCache(object):
+    """
+    The cache of parsed GET responses behind Catalog.get_xml.  Responses are
+    sorted into url classes, and each class is cached according to the rule
+    the CachePolicy gives for it.  If a DiskCache is given, new response
+    bodies are also written through to it, and load() can find responses
+    that an earlier process fetched.
+
+    The cache also holds derived values, such as name indexes, that were
+    computed from a set of source documents.  A derived value is dropped as
+    soon as one of its sources is invalidated or comes back from the server
+    with a different body, and otherwise lives for the max_age of the url
+    class it was stored under.
+
+    The cache is safe to share between threads.  Lookups never block;
+    stores lock one stripe of one segment.  invalidate() holds every lock
+    while it works, so no other thread sees it half done, and it bumps
+    generation: a response or derived value that was fetched before an
+    invalidation (as shown by the generation passed with it) is not stored
+    afterwards, since it may predate the write that caused the
+    invalidation.
+    """
+    def __init__(self, policy=None, disk=None, stripes=DEFAULT_STRIPES):
+        self.policy = policy if policy is not None else CachePolicy()
+        self.disk = disk
+        self.generation = 0
+        # one segment for the default rule, plus one for each class with a
+        # rule of its own; the set never changes, so lookups need no lock
+        self._segments = dict((name, _Segment(self.policy.rule(name).max_bytes, stripes))
+                for name in [None] + sorted(self.policy.rules))
+        self._derived = dict()
+        self._derived_lock = threading.Lock()
+
+    def rule(self, url):
+        return self.policy.rule(url_class(url))
+
+    def _segment(self, url):
+        name = url_class(url)
+        return self._segments[name if name in self._segments else None]
+
+    def get(self, url):
+        return self._segment(url).get(url)
+
+    def put(self, url, entry, changed=True, generation=None):
+        """
+        Cache a response.  changed should be False when the server confirmed
+        that the body is the one cached before, so that nothing derived from
+        it needs to be thrown away or written to disk again.  generation is
+        the cache's generation from before the response was requested.
+        """
+        still_valid = lambda: generation is None or generation == self.generation
+        self._segment(url).put(url, entry, still_valid)
+        if changed:
+            with self._derived_lock:
+                self._drop_derived([url], ())
+            if self.disk is not None and self.rule(url).enabled and still_valid():
+                self.disk.put(url, entry)
+
+    def get_derived(self, key, url_class):
+        derived = self._derived.get(key)
+        if derived is None:
+            return None
+        value, sources, timestamp = derived
+        if datetime.now() - timestamp >= self.policy.rule(url_class).max_age:
+            with self._derived_lock:
+                if self._derived.get(key) is derived:
+                    del self._derived[key]
+            return None
+        return value
+
+    def put_derived(self, key, url_class, value, sources, generation=None):
+        if not self.policy.rule(url_class).enabled:
+            return
+        with self._derived_lock:
+            if generation is None or generation == self.generation:
+                self._derived[key] = (value, frozenset(sources), datetime.now())
+
+    def _drop_derived(self, urls, prefixes):
+        # caller holds _derived_lock
+        urls = set(urls)
+        for key, (value, sources, timestamp) in self._derived.items():
+            if sources & urls or any(s.startswith(prefixes) for s in sources):
+                del self._derived[key]
+
+    def load(self, url):
+        """
+        Look for a response persisted by this or an earlier process.  The
+        entry has no parsed tree yet, and should be revalidated before use.
+        """
+        if self.disk is None or not self.rule(url).enabled:
+            return None
+        return self.disk.get(url)
+
+    def discard(self, url):
+        self.invalidate([url])
+
+    def _locks(self):
+        # every lock in the cache, always in the same order
+        locks = [stripe.lock for name in sorted(self._segments)
+                for stripe in self._segments[name].stripes]
+        return locks + [self._derived_lock]
+
+    def invalidate(self, urls=(), prefixes=()):
+        """
+        Evict the given urls, along with every entry whose url starts with
+        one of the given prefixes.
+        """
+        urls, prefixes = list(urls), tuple(prefixes)
+        locks = self._locks()
+        for lock in locks:
+            lock.acquire()
+        try:
+            self.generation += 1
+            for segment in self._segments.values():
+                for stripe in segment.stripes:
+                    doomed = [u for u in stripe.entries
+                            if u in urls or (prefixes and u.startswith(prefixes))]
+                    for url in doomed:
+                        segment._discard(stripe, url)
+            self._drop_derived(urls, prefixes)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+        if self.disk is not None:
+            self.disk.invalidate(urls, prefixes)
+
+    def clear(self):
+        self.invalidate(prefixes=[""])
+        if self.disk is not None:
+            self.disk.clear()
+
+    @property
+    def size(self):
+        return sum(s.size for s in self._segments.values())
+
+    def __len__(self):
+        return sum(len(s) for s in self._segments.values())
+
+    def __contains__(self, url):
+        return url in self._segment(url)
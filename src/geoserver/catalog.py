@@ -1,11 +1,27 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 import logging
-from geoserver.layer import Layer
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+from geoserver.cache import CachedResponse, DiskCache, ResponseCache, \
+    LAYERS, RESOURCES, STORES
+from geoserver.changeset import Changeset
+from geoserver.index import build_layer_index, build_resource_index, \
+    build_store_index, build_style_index
+from geoserver.resource import FeatureType, Coverage
+from geoserver.layer import Layer, resource_key
 from geoserver.store import coveragestore_from_index, datastore_from_index, \
     DataStore, CoverageStore, UnsavedDataStore, UnsavedCoverageStore
 from geoserver.style import Style
-from geoserver.support import prepare_upload_bundle
+from geoserver.bundle import BundleStream, bundle_digest, bundle_size, \
+    DEFAULT_SPOOL_SIZE
 from geoserver.layergroup import LayerGroup, UnsavedLayerGroup
+from geoserver.manifest import UploadManifest
+from geoserver.snapshot import take_snapshot
+from geoserver.support import object_url, parallel_map, SaveResult, \
+    DEFAULT_MAX_WORKERS, MIN_PARALLEL_ITEMS
+from geoserver.transport import ConnectionPool, MeteredBody, UploadResult, \
+    DEFAULT_POOL_SIZE, DEFAULT_IDLE_TIMEOUT
 from geoserver.workspace import workspace_from_index, Workspace
 from os import unlink
 import httplib2
@@ -43,28 +59,115 @@ class Catalog(object):
   - Maps, which provide a set of OWS services with a subset of the server's
     Layers
   - Namespaces, which provide unique identifiers for resources
+
+  A Catalog may be shared between threads.  Each request borrows its own
+  connection from the catalog's pool, and the response cache never blocks
+  readers: a lookup only waits for a write, and only to the same cache
+  stripe.  Invalidation after a write is atomic, and a response fetched
+  before it is never cached after it.  The ResourceInfo objects the catalog
+  hands out are not locked, though; don't change and save the same object
+  from several threads at once.
   """
 
-  def __init__(self, url, username="admin", password="geoserver"):
+  def __init__(self, url, username="admin", password="geoserver",
+          cache_policy=None, disk_cache=None, max_workers=DEFAULT_MAX_WORKERS,
+          executor=None, pool_size=DEFAULT_POOL_SIZE,
+          idle_timeout=DEFAULT_IDLE_TIMEOUT, spool_size=DEFAULT_SPOOL_SIZE,
+          retry_policy=None, upload_manifest=None):
     self.service_url = url
     if self.service_url.endswith("/"):
         self.service_url = self.service_url.strip("/")
-    self.http = httplib2.Http()
     self.username = username
     self.password = password
-    self.http.add_credentials(self.username, self.password)
-    netloc = urlparse(url).netloc
-    self.http.authorizations.append(
+    # httplib2.Http objects can't be shared between threads, so every
+    # request borrows one (and its keep-alive connection) from a pool, which
+    # also retries failed requests as retry_policy allows (see RetryPolicy;
+    # NO_RETRY turns retries off)
+    self.http = ConnectionPool(self._create_http, pool_size, idle_timeout,
+            retry_policy)
+    if isinstance(disk_cache, basestring):
+        disk_cache = DiskCache(disk_cache)
+    self._cache = ResponseCache(cache_policy, disk_cache)
+    self._snapshot = None
+    self._snapshot_lock = threading.Lock()
+    # catalog walks issue up to max_workers independent requests at once,
+    # or hand them to executor (anything with a ThreadPool-style map); so do
+    # save_all, snapshot, Changeset.flush and ingest, unless they are given
+    # a max_workers of their own
+    self.max_workers = max_workers
+    self.executor = executor
+    # the pool for walks is started on first use and kept, since starting
+    # and joining one per walk costs more than most walks take
+    self._walk_pool = None
+    self._walk_lock = threading.Lock()
+    self._walking = threading.local()
+    # uploads up to spool_size bytes are bundled in memory before they are
+    # sent; bigger ones are zipped while they are streamed
+    self.spool_size = spool_size
+    # with an UploadManifest (or the path of one), uploads of data that is
+    # already on the server are skipped
+    if isinstance(upload_manifest, basestring):
+        upload_manifest = UploadManifest(upload_manifest)
+    self.upload_manifest = upload_manifest
+
+  def _map(self, function, items):
+    items = list(items)
+    if len(items) < MIN_PARALLEL_ITEMS or getattr(self._walking, "active", False):
+        # too few to hand off; or already on one of the walk's threads,
+        # where waiting on the same pool could leave every thread in it
+        # waiting
+        return map(function, items)
+    def walk(item):
+        self._walking.active = True
+        try:
+            return function(item)
+        finally:
+            self._walking.active = False
+    return parallel_map(walk, items, self.max_workers,
+            self.executor or self._walk_executor())
+
+  def _walk_executor(self):
+    if self.max_workers is None or self.max_workers <= 1:
+        return None
+    with self._walk_lock:
+        if self._walk_pool is None:
+            self._walk_pool = ThreadPool(self.max_workers)
+        return self._walk_pool
+
+  def close(self):
+    """
+    Stop the threads the catalog's walks run on (a caller's executor is
+    left alone) and close its idle connections.  The catalog can still be
+    used afterwards; the threads are started again when needed.
+    """
+    with self._walk_lock:
+        pool, self._walk_pool = self._walk_pool, None
+    if pool is not None:
+        pool.close()
+        pool.join()
+    self.http.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+  def _create_http(self):
+    http = httplib2.Http()
+    http.add_credentials(self.username, self.password)
+    netloc = urlparse(self.service_url).netloc
+    http.authorizations.append(
         httplib2.BasicAuthentication(
-            (username, password),
+            (self.username, self.password),
             netloc,
-            url,
+            self.service_url,
             {},
             None,
             None,
-            self.http
+            http
             ))
-    self._cache = dict()
+    return http
 
   def add(self, object):
     raise NotImplementedError()
@@ -98,21 +201,114 @@ class Catalog(object):
       "Accept": "application/xml"
     }
     response, content = self.http.request(url, "DELETE", headers=headers)
-    self._cache.clear()
+    self._invalidate(object.href, recurse)
 
     if response.status == 200:
         return (response, content)
     else:
         raise FailedRequestError("Tried to make a DELETE request to %s but got a %d status code: \n%s" % (url, response.status, content))
 
+  def _invalidate(self, href, recurse=False):
+    """
+    Evict the cached responses that a write to href can affect: the object's
+    own documents and everything nested below it, the listing it appears in,
+    and the catalog-wide layer and layergroup indexes.  Recursive deletes
+    also reach into documents outside the object's own url space (the layers
+    of a store, or the resource behind a layer.)
+    """
+    urls, prefixes = self._affected_by(href, recurse)
+    self._cache.invalidate(urls, prefixes)
+    self.drop_snapshot()
+
+  def _invalidate_all(self, hrefs):
+    """
+    Like _invalidate, but for writes to several hrefs at once, with a single
+    pass over the cache.
+    """
+    urls, prefixes = set(), set()
+    for href in hrefs:
+        u, p = self._affected_by(href)
+        urls.update(u)
+        prefixes.update(p)
+    self._cache.invalidate(urls, prefixes)
+    self.drop_snapshot()
+
+  def _affected_by(self, href, recurse=False):
+    """
+    The cache keys and key prefixes evicted by _invalidate(href, recurse).
+    """
+    base = object_url(href)
+    parent = base.rsplit("/", 1)[0]
+
+    urls = [parent + ".xml",
+            "%s/layers.xml" % self.service_url,
+            "%s/layergroups.xml" % self.service_url]
+    prefixes = [base + ".", base + "/"]
+    if base.startswith("%s/workspaces/default/" % self.service_url):
+        # "default" is an alias for whichever workspace is the default, so
+        # the documents it really touched can't be told apart by url
+        prefixes.append("%s/workspaces/" % self.service_url)
+    if recurse:
+        prefixes.append("%s/layers/" % self.service_url)
+        prefixes.append("%s/workspaces/" % self.service_url)
+
+    return map(self._cache_key, urls), map(self._cache_key, prefixes)
+
+  def _cache_key(self, url):
+    return quote_plus(url, ":/")
+
+  def _index(self, build, url_class):
+    """
+    Look up a name index (see geoserver.index) in the response cache, and
+    build it from the catalog's listings if it isn't there.
+    """
+    index = self._cache.get_derived(build.__name__, url_class)
+    if index is None:
+        generation = self._cache.generation
+        index, sources = build(self)
+        self._cache.put_derived(build.__name__, url_class, index,
+                map(self._cache_key, sources), generation)
+    return index
+
+  def snapshot(self, max_workers=None):
+    """
+    Fetch the workspace index, every workspace's store listings, every
+    store's resource listing and the layer, layergroup and style indexes,
+    up to max_workers requests at a time, and install the result as a
+    CatalogSnapshot.  Until the next write through this catalog (or a call
+    to drop_snapshot) the get_* methods answer from the snapshot for those
+    listings instead of going to the server.  A snapshot taken while a
+    write went through the catalog is returned, but not installed.
+    """
+    self.drop_snapshot()
+    generation = self._cache.generation
+    snapshot = take_snapshot(self, max_workers)
+    with self._snapshot_lock:
+        if self._cache.generation == generation:
+            self._snapshot = snapshot
+        else:
+            logger.debug("not installing a snapshot taken during a write")
+    return snapshot
+
+  def drop_snapshot(self):
+    with self._snapshot_lock:
+        self._snapshot = None
+
   def get_xml(self, url):
     logger.debug("GET %s", url)
-    url = quote_plus(url, ":/")
+    url = self._cache_key(url)
+
+    snapshot = self._snapshot
+    if snapshot is not None and url in snapshot:
+        return snapshot.document(url)
 
     cached_response = self._cache.get(url)
 
     def is_valid(cached_response):
-        return cached_response is not None and datetime.now() - cached_response[0] < timedelta(seconds=5)
+        # responses younger than the max_age for their url class are used
+        # without asking the server; older ones are revalidated
+        max_age = self._cache.rule(url).max_age
+        return cached_response is not None and datetime.now() - cached_response.timestamp < max_age
 
     def parse_or_raise(xml):
         try:
@@ -124,15 +320,37 @@ class Catalog(object):
                 e)
 
     if is_valid(cached_response):
-            raw_text = cached_response[1]
-            return parse_or_raise(cached_response[1])
+        return cached_response.tree
+    if cached_response is None:
+        cached_response = self._cache.load(url)
+
+    headers = dict()
+    if cached_response is not None:
+        headers.update(cached_response.conditional_headers())
+    # a write that lands while this request is in flight invalidates the
+    # cache; the response is then still returned, but not cached
+    generation = self._cache.generation
+    response, content = self.http.request(url, headers=headers)
+    etag, last_modified = response.get("etag"), response.get("last-modified")
+
+    if response.status == 304 and cached_response is not None:
+        logger.debug("%s not modified", url)
+        entry = cached_response.revalidated(etag, last_modified)
+        changed = False
+    elif response.status == 200:
+        entry = CachedResponse(content, None, etag, last_modified)
+        changed = cached_response is None or cached_response.digest != entry.digest
+        if not changed:
+            # no validators from the server, but the body hasn't changed
+            entry = cached_response.revalidated(etag, last_modified)
     else:
-        response, content = self.http.request(url)
-        if response.status == 200:
-            self._cache[url] = (datetime.now(), content)
-            return parse_or_raise(content)
-        else:
-            raise FailedRequestError("Tried to make a GET request to %s but got a %d status code: \n%s" % (url, response.status, content))
+        raise FailedRequestError("Tried to make a GET request to %s but got a %d status code: \n%s" % (url, response.status, content))
+
+    if entry.tree is None:
+        # new content, or a body loaded from the disk cache
+        entry.tree = parse_or_raise(entry.content)
+    self._cache.put(url, entry, changed, generation)
+    return entry.tree
 
   def save(self, obj):
     """
@@ -141,6 +359,11 @@ class Catalog(object):
     gets the object's REST location and the XML from the object,
     then POSTS the request.
     """
+    response = self._send(obj)
+    self._invalidate(obj.href)
+    return response
+
+  def _send(self, obj):
     url = obj.href
     message = obj.message()
 
@@ -149,34 +372,66 @@ class Catalog(object):
       "Accept": "application/xml"
     }
     logger.debug("%s %s", obj.save_method, obj.href)
-    response = self.http.request(url, obj.save_method, message, headers)
-    self._cache.clear()
-    return response
+    return self.http.request(url, obj.save_method, message, headers)
+
+  def _try_save(self, obj):
+    """
+    Send an object's changes without invalidating the cache, and report how
+    it went as a SaveResult rather than raising.
+    """
+    try:
+        response, content = self._send(obj)
+    except Exception, e:
+        logger.debug("%s %s failed: %s", obj.save_method, obj.href, e)
+        result = SaveResult(obj, error=str(e))
+        result.attempts = getattr(e, "attempts", 1)
+        return result
+    result = SaveResult(obj, response.status)
+    result.attempts = getattr(response, "attempts", 1)
+    if not result.success:
+        result.error = content
+    return result
+
+  def save_all(self, objects, max_workers=None):
+    """
+    Save several objects at once, returning a SaveResult for each, in
+    order.  A failure doesn't stop the rest from being saved.
+    """
+    objects = list(objects)
+    try:
+        if max_workers is None:
+            results = self._map(self._try_save, objects)
+        else:
+            results = parallel_map(self._try_save, objects, max_workers)
+    finally:
+        # even a partly applied batch may have changed any of these
+        self._invalidate_all([obj.href for obj in objects])
+    return results
+
+  def changeset(self):
+    """
+    Start a Changeset: a set of new and modified objects to be written to
+    this catalog together.
+    """
+    return Changeset(self)
 
   def get_store(self, name, workspace=None):
       #stores = [s for s in self.get_stores(workspace) if s.name == name]
       if workspace is None:
-          store = None
-          for ws in self.get_workspaces():
-              found = None
-              try:
-                  found = self.get_store(name, ws)
-              except:
-                  # don't expect every workspace to contain the named store
-                  pass
-              if found:
-                  if store:
-                      raise AmbiguousRequestError("Multiple stores found named: " + name)
-                  else:
-                      store = found
-
-          if not store:
+          candidates = self._index(build_store_index, STORES).get(name, ())
+          if len(candidates) == 0:
               raise FailedRequestError("No store found named: " + name)
-          return store
+          elif len(candidates) > 1:
+              raise AmbiguousRequestError("Multiple stores found named: " + name)
+          ws_name, kind = candidates[0]
+          workspace = Workspace(self, ws_name)
+          if kind == "dataStore":
+              return DataStore(self, workspace, name)
+          else:
+              return CoverageStore(self, workspace, name)
       else: # workspace is not None
           logger.debug("datastore url is [%s]", workspace.datastore_url )
-          ds_list = self.get_xml(workspace.datastore_url)
-          cs_list = self.get_xml(workspace.coveragestore_url)
+          [(_, ds_list, cs_list)] = self._store_listings([workspace])
           datastores = [n for n in ds_list.findall("dataStore") if n.find("name").text == name]
           coveragestores = [n for n in cs_list.findall("coverageStore") if n.find("name").text == name]
           ds_len, cs_len = len(datastores), len(coveragestores)
@@ -190,19 +445,27 @@ class Catalog(object):
           else:
               raise AmbiguousRequestError(str(workspace) + " and name: " + name + " do not uniquely identify a layer")
 
+  def _store_listings(self, workspaces):
+      """
+      Fetch the datastore and coveragestore listings of several workspaces
+      at once, as a list of (workspace, datastores, coveragestores).
+      """
+      urls = []
+      for ws in workspaces:
+          urls.extend([ws.datastore_url, ws.coveragestore_url])
+      listings = self._map(self.get_xml, urls)
+      return zip(workspaces, listings[0::2], listings[1::2])
+
   def get_stores(self, workspace=None):
       if workspace is not None:
-          ds_list = self.get_xml(workspace.datastore_url)
-          cs_list = self.get_xml(workspace.coveragestore_url)
-          datastores = [datastore_from_index(self, workspace, n) for n in ds_list.findall("dataStore")]
-          coveragestores = [coveragestore_from_index(self, workspace, n) for n in cs_list.findall("coverageStore")]
-          return datastores + coveragestores
+          workspaces = [workspace]
       else:
-          stores = []
-          for ws in self.get_workspaces():
-              a = self.get_stores(ws)
-              stores.extend(a)
-          return stores
+          workspaces = self.get_workspaces()
+      stores = []
+      for ws, ds_list, cs_list in self._store_listings(workspaces):
+          stores.extend(datastore_from_index(self, ws, n) for n in ds_list.findall("dataStore"))
+          stores.extend(coveragestore_from_index(self, ws, n) for n in cs_list.findall("coverageStore"))
+      return stores
 
   def create_datastore(self, name, workspace = None):
       if isinstance(workspace, basestring):
@@ -220,11 +483,103 @@ class Catalog(object):
           workspace = self.get_default_workspace()
       return UnsavedCoverageStore(self, name, workspace)
 
-  def add_data_to_store(self, store, name, data, overwrite = False, charset = None):
+  def _bundle(self, name, data, compression=None):
+    """
+    The body for uploading a dict of extensions to paths or file-like
+    objects, and the seconds it took to make: the finished archive if the
+    components add up to no more than spool_size bytes, or else a
+    BundleStream to produce it while it is sent.
+    """
+    started = time.time()
+    size = bundle_size(data)
+    if size is not None and size <= self.spool_size:
+        body = BundleStream(name, data, compression=compression).read()
+    else:
+        body = BundleStream(name, data, compression=compression)
+    return body, time.time() - started
+
+  def _check_upload(self, workspace, store, name, data, params=(), stores=None):
+    """
+    Look an upload of dict data up in the upload manifest.  Returns the
+    (key, digest) to record once the upload succeeds (None if there is no
+    manifest, or the data can't be hashed) and whether the manifest says
+    the same data is already in a store that still exists.  That is checked
+    against the workspace's store listings, or against stores, a store
+    index (see build_store_index), if one is given.
+    """
+    if self.upload_manifest is None or not isinstance(data, dict):
+        return None, False
+    digest = bundle_digest(data, params)
+    if digest is None:
+        return None, False
+    key = "%s/%s/%s" % (workspace, store, name)
+    if self.upload_manifest.get(key) != digest:
+        return (key, digest), False
+    if stores is not None:
+        unchanged = any(ws == workspace for ws, kind in stores.get(store, ()))
+    else:
+        # just this workspace's listings: the whole index would be walked
+        # again after every upload, since uploads invalidate its sources
+        [(_, ds_list, cs_list)] = self._store_listings([Workspace(self, workspace)])
+        unchanged = any(n.find("name").text == store for n in
+                ds_list.findall("dataStore") + cs_list.findall("coverageStore"))
+    if unchanged:
+        logger.debug("%s is unchanged since it was last uploaded", key)
+    return (key, digest), unchanged
+
+  def _track_upload(self, dedup, upload):
+    """
+    Run upload(), then record the data's digest in the upload manifest if
+    it succeeded or forget the old one if it failed.
+    """
+    if dedup is None:
+        return upload()
+    key, digest = dedup
+    try:
+        result = upload()
+    except:
+        self.upload_manifest.discard(key)
+        raise
+    self.upload_manifest.put(key, digest)
+    return result
+
+  def _upload(self, url, body, headers, progress=None, bundle_time=0.0):
+    """
+    PUT an upload, metering it as it goes out (see MeteredBody.)  Returns
+    the response, its content and an UploadResult.  Bodies held in memory
+    go out over a pooled connection; ones that can only be read once, over
+    a connection of their own.
+    """
+    body = MeteredBody.wrap(url, body, progress, bundle_time)
+    headers = dict(headers)
+    headers.update(body.headers())
+    send = self.http.request if body.replayable else self.http.stream
+    response, content = send(url, "PUT", body, headers)
+    return response, content, body.finish(response.status)
+
+  def add_data_to_store(self, store, name, data, overwrite = False, charset = None,
+          compression = None, progress = None):
+      """
+      Upload data to an existing store: a dict of extensions to paths or
+      file-like objects, bundled as for prepare_upload_bundle, or the path
+      of a ready-made ZIP archive.  progress, if given, is called with an
+      UploadResult as the upload proceeds, and the final UploadResult is
+      returned.
+
+      If the catalog has an upload manifest and the same dict data was
+      uploaded here before, nothing is bundled or sent, and the result is
+      marked as skipped.
+      """
+      dedup, unchanged = self._check_upload(store.workspace.name, store.name,
+              name, data, [("kind", "dataStore"), ("charset", charset)])
+      if unchanged:
+          return UploadResult.skip(store.href)
+
+      bundle_time = 0.0
       if isinstance(data, dict):
-          bundle = prepare_upload_bundle(name, data)
+          message, bundle_time = self._bundle(name, data, compression)
       else:
-          bundle = data
+          message = open(data)
 
       params = dict()
       if overwrite:
@@ -237,20 +592,34 @@ class Catalog(object):
       else:
           params = ""
 
-      message = open(bundle)
       headers = { 'Content-Type': 'application/zip', 'Accept': 'application/xml' }
       url = "%s/workspaces/%s/datastores/%s/file.shp%s" % (
               self.service_url, store.workspace.name, store.name, params)
 
-      try:
-          headers, response = self.http.request(url, "PUT", message, headers)
-          self._cache.clear()
-          if headers.status != 201:
+      def upload():
+          headers_, response, result = self._upload(url, message, headers,
+                  progress, bundle_time)
+          self._invalidate(store.href)
+          if headers_.status != 201:
               raise UploadError(response)
-      finally:
-          unlink(bundle)
+          return result
 
-  def create_featurestore(self, name, data, workspace=None, overwrite=False, charset=None):
+      try:
+          return self._track_upload(dedup, upload)
+      finally:
+          if not isinstance(data, dict):
+              message.close()
+              unlink(data)
+          elif isinstance(message, BundleStream):
+              message.close()
+
+  def create_featurestore(self, name, data, workspace=None, overwrite=False, charset=None,
+          compression=None, progress=None):
+    """
+    Create a datastore from uploaded data, given as for add_data_to_store,
+    and return the UploadResult.  Re-uploads of unchanged dict data are
+    skipped as for add_data_to_store.
+    """
     if not overwrite:
         try:
             store = self.get_store(name, workspace)
@@ -264,6 +633,30 @@ class Catalog(object):
 
     if workspace is None:
       workspace = self.get_default_workspace()
+    dedup, unchanged = self._check_upload(workspace.name, name, name, data,
+            [("kind", "dataStore"), ("charset", charset)])
+    if unchanged:
+      return UploadResult.skip(DataStore(self, workspace, name).href)
+
+    bundle_time = 0.0
+    if  isinstance(data,dict):
+        logger.debug('Data is NOT a zipfile')
+        message, bundle_time = self._bundle(name, data, compression)
+    else:
+        logger.debug('Data is a zipfile')
+        message = open(data)
+    try:
+      return self._track_upload(dedup, lambda: self._upload_featurestore(
+              name, message, workspace, charset, progress, bundle_time))
+    finally:
+      if not isinstance(data, dict):
+        message.close()
+        unlink(data)
+      elif isinstance(message, BundleStream):
+        message.close()
+
+  def _upload_featurestore(self, name, message, workspace, charset=None,
+          progress=None, bundle_time=0.0):
     if charset:
         ds_url = "%s/workspaces/%s/datastores/%s/file.shp?charset=%s" % (self.service_url, workspace.name, name, charset)
     else:
@@ -274,22 +667,22 @@ class Catalog(object):
       "Content-type": "application/zip",
       "Accept": "application/xml"
     }
-    if  isinstance(data,dict):
-        logger.debug('Data is NOT a zipfile')
-        archive = prepare_upload_bundle(name, data)
-    else:
-        logger.debug('Data is a zipfile')
-        archive = data
-    message = open(archive)
-    try:
-      headers, response = self.http.request(ds_url, "PUT", message, headers)
-      self._cache.clear()
-      if headers.status != 201:
-          raise UploadError(response)
-    finally:
-      unlink(archive)
-
-  def create_coveragestore(self, name, data, workspace=None, overwrite=False):
+    headers, response, result = self._upload(ds_url, message, headers,
+            progress, bundle_time)
+    self._invalidate(DataStore(self, workspace, name).href)
+    if headers.status != 201:
+        raise UploadError(response)
+    return result
+
+  def create_coveragestore(self, name, data, workspace=None, overwrite=False,
+          compression=None, progress=None):
+    """
+    Create a coveragestore from uploaded data: the path of a GeoTIFF, a
+    file-like object, or a dict of extensions to paths or file-like objects
+    (a WorldImage bundle if it includes a "tfw".)  progress and skipping
+    unchanged dict data work as for add_data_to_store, and the
+    UploadResult is returned.
+    """
     if not overwrite:
         try:
             store = self.get_store(name, workspace)
@@ -303,34 +696,47 @@ class Catalog(object):
 
     if workspace is None:
       workspace = self.get_default_workspace()
-    headers = {
-      "Content-type": "image/tiff",
-      "Accept": "application/xml"
-    }
+    dedup, unchanged = self._check_upload(workspace.name, name, name, data,
+            [("kind", "coverageStore"), ("charset", None)])
+    if unchanged:
+      return UploadResult.skip(CoverageStore(self, workspace, name).href)
 
-    zip = None
-    ext = "geotiff"
+    bundle_time = 0.0
 
     if isinstance(data, dict):
-      zip = prepare_upload_bundle(name, data)
-      message = open(zip)
-      if "tfw" in data:
-        headers['Content-type'] = 'application/zip'
-        ext = "worldimage"
+      message, bundle_time = self._bundle(name, data, compression)
     elif isinstance(data, basestring):
       message = open(data)
     else:
       message = data
 
-    cs_url = "%s/workspaces/%s/coveragestores/%s/file.%s" % (self.service_url, workspace.name, name, ext)
     try:
-      headers, response = self.http.request(cs_url, "PUT", message, headers)
-      self._cache.clear()
-      if headers.status != 201:
-          raise UploadError(response)
+      return self._track_upload(dedup, lambda: self._upload_coveragestore(
+              name, message, workspace, isinstance(data, dict) and "tfw" in data,
+              progress, bundle_time))
     finally:
-      if zip is not None:
-        unlink(zip)
+      if isinstance(message, BundleStream):
+        message.close()
+
+  def _upload_coveragestore(self, name, message, workspace, worldimage=False,
+          progress=None, bundle_time=0.0):
+    headers = {
+      "Content-type": "image/tiff",
+      "Accept": "application/xml"
+    }
+
+    ext = "geotiff"
+    if worldimage:
+      headers['Content-type'] = 'application/zip'
+      ext = "worldimage"
+
+    cs_url = "%s/workspaces/%s/coveragestores/%s/file.%s" % (self.service_url, workspace.name, name, ext)
+    headers, response, result = self._upload(cs_url, message, headers,
+            progress, bundle_time)
+    self._invalidate(CoverageStore(self, workspace, name).href)
+    if headers.status != 201:
+        raise UploadError(response)
+    return result
 
   def get_resource(self, name, store=None, workspace=None):
     if store is not None:
@@ -342,30 +748,28 @@ class Catalog(object):
       else:
         return candidates[0]
 
+    candidates = self._index(build_resource_index, RESOURCES).get(name, ())
     if workspace is not None:
-      for store in self.get_stores(workspace):
-        resource = self.get_resource(name, store)
-        if resource is not None:
-          return resource
+      candidates = [c for c in candidates if c[0] == workspace.name]
+    if len(candidates) == 0:
       return None
+    elif len(candidates) > 1:
+      raise AmbiguousRequestError("Multiple resources found named %s: %s" % (
+          name, ", ".join("%s:%s" % (ws, st) for ws, st, kind in candidates)))
 
-    for ws in self.get_workspaces():
-      resource = self.get_resource(name, workspace=ws)
-      if resource is not None:
-        return resource
-    return None
+    ws_name, store_name, kind = candidates[0]
+    workspace = Workspace(self, ws_name)
+    if kind == "dataStore":
+      return FeatureType(self, workspace, DataStore(self, workspace, store_name), name)
+    else:
+      return Coverage(self, workspace, CoverageStore(self, workspace, store_name), name)
 
   def get_resources(self, store=None, workspace=None, namespace=None):
     if store is not None:
       return store.get_resources()
-    if workspace is not None:
-      resources = []
-      for store in self.get_stores(workspace):
-          resources.extend(self.get_resources(store))
-      return resources
     resources = []
-    for ws in self.get_workspaces():
-      resources.extend(self.get_resources(workspace=ws))
+    for listing in self._map(self.get_resources, self.get_stores(workspace)):
+      resources.extend(listing)
     return resources
 
   def get_layer(self, name):
@@ -377,12 +781,25 @@ class Catalog(object):
           return None
 
   def get_layers(self, resource=None, style=None):
-    description = self.get_xml("%s/layers.xml" % self.service_url)
-    lyrs = [Layer(self, l.find("name").text) for l in description.findall("layer")]
     if resource is not None:
-      lyrs = [l for l in lyrs if l.resource.href == resource.href]
-    # TODO: Filter by style
-    return lyrs
+      index = self._index(build_layer_index, LAYERS)
+      names = index.get(resource_key(resource.href), ())
+    else:
+      description = self.get_xml("%s/layers.xml" % self.service_url)
+      names = [l.find("name").text for l in description.findall("layer")]
+    if style is not None:
+      users = self._style_users(style)[0]
+      names = [n for n in names if n in users]
+    return [Layer(self, n) for n in names]
+
+  def _style_users(self, style):
+    """
+    The names of the layers and of the layer groups that use a style (given
+    as a Style or by name.)
+    """
+    if isinstance(style, Style):
+      style = style.name
+    return self._index(build_style_index, LAYERS).get(style, ((), ()))
 
   def get_maps(self):
     raise NotImplementedError()
@@ -398,9 +815,13 @@ class Catalog(object):
       except FailedRequestError, e:
           return None
 
-  def get_layergroups(self):
+  def get_layergroups(self, style=None):
     groups = self.get_xml("%s/layergroups.xml" % self.service_url)
-    return [LayerGroup(self, g.find("name").text) for g in groups.findall("layerGroup")]
+    names = [g.find("name").text for g in groups.findall("layerGroup")]
+    if style is not None:
+      users = self._style_users(style)[1]
+      names = [n for n in names if n in users]
+    return [LayerGroup(self, n) for n in names]
 
   def create_layergroup(self, name, layers = (), styles = (), bounds = None):
       if any(g.name == name for g in self.get_layergroups()):
@@ -436,7 +857,7 @@ class Catalog(object):
       style_url = "%s/styles?name=%s" % (self.service_url, name)
       headers, response = self.http.request(style_url, "POST", data, headers)
 
-    self._cache.clear()
+    self._invalidate(style_url)
     if headers.status < 200 or headers.status > 299: raise UploadError(response)
 
   def get_namespace(self, id=None, prefix=None, uri=None):
@@ -458,7 +879,7 @@ class Catalog(object):
 
     headers, response = self.http.request(workspace_url, "POST", xml, headers)
     assert 200 <= headers.status < 300, "Tried to create workspace but got " + str(headers.status) + ": " + response
-    self._cache.clear()
+    self._invalidate(Workspace(self, name).href)
     return self.get_workspace(name)
 
   def get_workspaces(self):
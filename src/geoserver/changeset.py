@@ -0,0 +1,165 @@
+"""
+Unit-of-work support: a Changeset gathers new and modified catalog objects
+and writes them in an order that respects the dependencies between them,
+sending independent writes side by side.
+"""
+import logging
+import threading
+from multiprocessing.pool import ThreadPool
+
+from geoserver.support import object_url, SaveResult
+
+logger = logging.getLogger("gsconfig.changeset")
+
+WORKSPACE, STORE, RESOURCE, STYLE, LAYER, LAYERGROUP = range(6)
+"""
+The kinds of objects a Changeset can order, in the order their writes
+generally have to happen.
+"""
+
+def object_key(catalog, obj):
+    """
+    (kind, path) for a catalog object, worked out from its href: path is
+    (workspace,) for a workspace, (workspace, store) for a store,
+    (workspace, store, name) for a resource, and (name,) for styles, layers
+    and layergroups.  Returns None for hrefs outside the usual layout.
+    """
+    url = object_url(obj.href)
+    if not url.startswith(catalog.service_url + "/"):
+        return None
+    parts = url[len(catalog.service_url) + 1:].split("/")
+
+    if parts[0] == "workspaces":
+        path = tuple(parts[1::2])
+        if len(parts) == 2:
+            return WORKSPACE, path
+        elif len(parts) == 4 and parts[2] in ("datastores", "coveragestores"):
+            return STORE, path
+        elif len(parts) == 6 and parts[4] in ("featuretypes", "coverages"):
+            return RESOURCE, path
+    elif len(parts) == 2:
+        kind = dict(styles=STYLE, layers=LAYER, layergroups=LAYERGROUP).get(parts[0])
+        if kind is not None:
+            return kind, (parts[1],)
+    return None
+
+def depends_on(key, other):
+    """
+    Whether the object with key has to be written after the one with other.
+    Stores, resources and their workspaces depend on whatever contains them
+    in the url hierarchy; a layer depends on the resources it is named
+    after and on the styles being written with it, and a layergroup on
+    the layers and styles being written with it.
+    """
+    if key is None or other is None:
+        return False
+    kind, path = key
+    other_kind, other_path = other
+    if kind in (STORE, RESOURCE):
+        return other_kind < kind and path[:len(other_path)] == other_path
+    elif kind == LAYER:
+        return (other_kind == RESOURCE and other_path[-1] == path[0]) or \
+                other_kind == STYLE
+    elif kind == LAYERGROUP:
+        return other_kind in (LAYER, STYLE)
+    return False
+
+def needs_save(obj):
+    """
+    Whether an object is new or has changes to write.  A name in its dirty
+    dict identifies the object; it doesn't count as a change.
+    """
+    if obj.save_method == "POST":
+        return True
+    return obj.modified and any(key != "name" for key in obj.dirty)
+
+class Changeset(object):
+    """
+    A set of new (Unsaved*) and modified catalog objects to be written
+    together:
+
+        changeset = cat.changeset()
+        changeset.add(UnsavedWorkspace(cat, "ws"), store, featuretype, layer)
+        for result in changeset.flush():
+            print result
+
+    flush() orders the writes by the hierarchy in the objects' hrefs:
+    workspaces before their stores, stores before their resources,
+    resources and styles before layers, and layers before layergroups.
+    Each write starts as soon as the ones it depends on have succeeded, so
+    independent branches (say, the stores of two different workspaces) are
+    written side by side.  When a write fails, everything that depends on
+    it is skipped.  The catalog's cache is invalidated once, after the last
+    write.
+    """
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.objects = []
+
+    def add(self, *objects):
+        for obj in objects:
+            if not any(obj is o for o in self.objects):
+                self.objects.append(obj)
+
+    def __len__(self):
+        return len(self.objects)
+
+    def flush(self, max_workers=None):
+        """
+        Write every new or changed object, returning a SaveResult for each,
+        in the order they were added.  Failed and skipped objects stay in
+        the changeset, so flush() can be called again.
+        """
+        catalog = self.catalog
+        pending = [obj for obj in self.objects if needs_save(obj)]
+        if not pending:
+            return []
+        keys = [object_key(catalog, obj) for obj in pending]
+        waiting = [set(j for j, other in enumerate(keys)
+                if j != i and depends_on(key, other))
+                for i, key in enumerate(keys)]
+        dependents = [[j for j, deps in enumerate(waiting) if i in deps]
+                for i in range(len(pending))]
+
+        results = [None] * len(pending)
+        done = threading.Condition()
+        if max_workers is None:
+            max_workers = catalog.max_workers
+        pool = ThreadPool(max(1, min(max_workers or 1, len(pending))))
+
+        def start(i):
+            pool.apply_async(catalog._try_save, (pending[i],),
+                    callback=lambda result: finish(i, result))
+
+        def finish(i, result):
+            with done:
+                results[i] = result
+                for j in dependents[i]:
+                    if results[j] is not None:
+                        continue
+                    if not result.success:
+                        logger.debug("skipping %s: %s failed",
+                                pending[j].href, pending[i].href)
+                        finish(j, SaveResult(pending[j],
+                            error="not saved: %s failed" % pending[i].href))
+                        continue
+                    waiting[j].discard(i)
+                    if not waiting[j]:
+                        start(j)
+                done.notify()
+
+        try:
+            with done:
+                for i, deps in enumerate(waiting):
+                    if not deps:
+                        start(i)
+                while None in results:
+                    done.wait()
+        finally:
+            pool.close()
+            pool.join()
+            catalog._invalidate_all([obj.href for obj in pending])
+
+        saved = [r.obj for r in results if r.success]
+        self.objects = [o for o in self.objects if not any(o is s for s in saved)]
+        return results
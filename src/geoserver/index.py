@@ -0,0 +1,124 @@
+"""
+Name indexes over the catalog, built from its listings so that lookups by
+name don't have to walk every workspace.  Each builder returns the index and
+the urls of the documents it was built from; the catalog keeps the index in
+its response cache, which drops it again when any of those documents
+changes.
+"""
+
+from geoserver.layer import Layer, resource_key
+from geoserver.layergroup import LayerGroup
+from geoserver.store import DataStore, CoverageStore
+from geoserver.workspace import workspace_from_index, Workspace
+
+def build_store_index(catalog):
+    """
+    Map each store name to a tuple of (workspace name, kind) pairs, where
+    kind is the store's resource_type ("dataStore" or "coverageStore").
+    """
+    workspaces_url = "%s/workspaces.xml" % catalog.service_url
+    workspaces = [workspace_from_index(catalog, n)
+            for n in catalog.get_xml(workspaces_url).findall("workspace")]
+    urls = [workspaces_url]
+    index = dict()
+    for ws, ds_list, cs_list in catalog._store_listings(workspaces):
+        urls.extend([ws.datastore_url, ws.coveragestore_url])
+        for kind, nodes in (("dataStore", ds_list.findall("dataStore")),
+                            ("coverageStore", cs_list.findall("coverageStore"))):
+            for node in nodes:
+                name = node.find("name").text
+                index[name] = index.get(name, ()) + ((ws.name, kind),)
+    return index, urls
+
+def build_resource_index(catalog):
+    """
+    Map each featuretype and coverage name to a tuple of (workspace name,
+    store name, store kind) triples, one for each store publishing a
+    resource by that name.
+    """
+    stores, sources = build_store_index(catalog)
+    located = sorted((ws, store, kind)
+            for store, places in stores.items() for ws, kind in places)
+
+    def listing_url(place):
+        ws, store, kind = place
+        cls = DataStore if kind == "dataStore" else CoverageStore
+        return cls(catalog, Workspace(catalog, ws), store).resource_url
+    urls = map(listing_url, located)
+    listings = catalog._map(catalog.get_xml, urls)
+
+    index = dict()
+    for place, listing in zip(located, listings):
+        tag = "featureType" if place[2] == "dataStore" else "coverage"
+        for node in listing.findall(tag):
+            name = node.find("name").text
+            index[name] = index.get(name, ()) + (place,)
+    return index, sources + urls
+
+def build_layer_index(catalog):
+    """
+    Map each resource, by its resource_key, to a tuple of the names of the
+    layers publishing it.  Every layer document is fetched, in parallel.
+    """
+    layers_url = "%s/layers.xml" % catalog.service_url
+    layers = [Layer(catalog, n.find("name").text)
+            for n in catalog.get_xml(layers_url).findall("layer")]
+    urls = [l.href for l in layers]
+    docs = catalog._map(catalog.get_xml, urls)
+
+    # the catalog module imports this one, so its errors can only be
+    # looked up once both are loaded
+    from geoserver.catalog import AmbiguousRequestError, FailedRequestError
+
+    index = dict()
+    for layer, doc in zip(layers, docs):
+        layer.dom = doc
+        href = layer.resource_href
+        if href is None or resource_key(href) is None:
+            # no usable link; find the resource by name instead
+            try:
+                resource = layer.resource
+            except (AmbiguousRequestError, FailedRequestError):
+                # the name is shared between workspaces, or the lookup failed
+                continue
+            if resource is None:
+                # not a featuretype or coverage (a cascaded WMS layer, say)
+                continue
+            href = resource.href
+        key = resource_key(href)
+        index[key] = index.get(key, ()) + (layer.name,)
+    return index, [layers_url] + urls
+
+def build_style_index(catalog):
+    """
+    Map each style name to a pair of tuples: the names of the layers using
+    it as their default or an alternate style, and the names of the layer
+    groups that name it for one of their layers.  Every layer and layer
+    group document is fetched, in parallel.
+    """
+    rest = catalog.service_url
+    layers_url = "%s/layers.xml" % rest
+    groups_url = "%s/layergroups.xml" % rest
+    layers = [Layer(catalog, n.find("name").text)
+            for n in catalog.get_xml(layers_url).findall("layer")]
+    groups = [LayerGroup(catalog, n.find("name").text)
+            for n in catalog.get_xml(groups_url).findall("layerGroup")]
+    urls = [l.href for l in layers] + [g.href for g in groups]
+    docs = catalog._map(catalog.get_xml, urls)
+
+    index = dict()
+    def add(style, layer=None, group=None):
+        users, groups = index.get(style, ((), ()))
+        if layer is not None and layer not in users:
+            users += (layer,)
+        if group is not None and group not in groups:
+            groups += (group,)
+        index[style] = (users, groups)
+
+    for layer, doc in zip(layers, docs):
+        for node in doc.findall("defaultStyle/name") + doc.findall("styles/style/name"):
+            add(node.text, layer=layer.name)
+    for group, doc in zip(groups, docs[len(layers):]):
+        for node in doc.findall("styles/style/name"):
+            add(node.text, group=group.name)
+    return index, [layers_url, groups_url] + urls
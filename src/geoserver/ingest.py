@@ -0,0 +1,228 @@
+"""
+Bulk uploads: an ingest pipeline that checks, bundles and uploads many
+datasets at once, overlapping the three stages.
+
+    from geoserver.ingest import ingest
+    jobs = ((name, {"shp": path + ".shp", "dbf": path + ".dbf",
+                    "shx": path + ".shx", "prj": path + ".prj"}, "topp")
+            for name, path in datasets)
+    for result in ingest(cat, jobs, max_workers=4):
+        print result
+"""
+import logging
+import threading
+import time
+from Queue import Queue
+
+from geoserver.bundle import BundleStream
+from geoserver.cache import STORES
+from geoserver.catalog import ConflictingDataError
+from geoserver.index import build_store_index
+from geoserver.store import CoverageStore, DataStore
+from geoserver.support import DEFAULT_MAX_WORKERS
+from geoserver.transport import UploadResult
+from geoserver.workspace import Workspace
+
+logger = logging.getLogger("gsconfig.ingest")
+
+DEFAULT_MAX_BUNDLES = 4
+"""
+How many bundles an ingest prepares ahead of the uploads unless told
+otherwise.
+"""
+
+DEFAULT_BUNDLERS = 2
+"""
+How many threads an ingest zips bundles on unless told otherwise.
+"""
+
+class IngestResult(object):
+    """
+    The outcome of one ingest job.  upload is the UploadResult of the job's
+    upload (with its bundle, transfer and server timings), or None if it
+    never got that far; error is the exception that stopped the job, if
+    any.  check_time is the time spent looking for an existing store, and
+    queue_time the time the prepared bundle waited for a free upload slot.
+    """
+    def __init__(self, name, workspace, kind):
+        self.name = name
+        self.workspace = workspace
+        self.kind = kind
+        self.upload = None
+        self.error = None
+        self.check_time = 0.0
+        self.queue_time = 0.0
+
+    @property
+    def success(self):
+        return self.error is None and self.upload is not None
+
+    @property
+    def skipped(self):
+        """
+        Whether the upload was skipped because the catalog's upload manifest
+        showed the same data was already there.
+        """
+        return self.upload is not None and self.upload.skipped
+
+    def __nonzero__(self):
+        return self.success
+
+    def __repr__(self):
+        if self.skipped:
+            outcome = "skipped"
+        elif self.success:
+            outcome = "ok"
+        else:
+            outcome = "failed: %s" % self.error
+        return "<IngestResult %s:%s %s %s>" % (self.workspace, self.name,
+                self.kind, outcome)
+
+def _kind(data):
+    if isinstance(data, dict):
+        return "dataStore" if "shp" in data else "coverageStore"
+    return "dataStore" if str(data).lower().endswith(".zip") else "coverageStore"
+
+def _store_href(catalog, kind, workspace, name):
+    if kind == "dataStore":
+        return DataStore(catalog, workspace, name).href
+    return CoverageStore(catalog, workspace, name).href
+
+class _Prepared(object):
+    def __init__(self, result, workspace, data, body=None, bundle_time=0.0,
+            dedup=None):
+        self.result = result
+        self.dedup = dedup
+        self.workspace = workspace
+        self.data = data
+        self.body = body
+        self.bundle_time = bundle_time
+        self.queued = time.time()
+
+    def close(self):
+        # streams we made, and files we opened; not the caller's own
+        if isinstance(self.body, BundleStream) or isinstance(self.data, basestring):
+            self.body.close()
+
+def ingest(catalog, jobs, overwrite=False, max_workers=None,
+        max_bundles=DEFAULT_MAX_BUNDLES, bundlers=DEFAULT_BUNDLERS,
+        compression=None, progress=None):
+    """
+    Create a store for each (name, data, workspace) job, as
+    Catalog.create_featurestore or create_coveragestore would, returning an
+    IngestResult per job in order.  Bundling and uploads overlap; at most
+    max_bundles + bundlers + max_workers bundles are held at once, and jobs
+    (which may be a generator) is read no faster than that.
+    """
+    if max_workers is None:
+        max_workers = catalog.max_workers or DEFAULT_MAX_WORKERS
+    max_workers = max(1, max_workers)
+    jobs = enumerate(iter(jobs))
+    jobs_lock = threading.Lock()
+    ready = Queue(max(1, max_bundles))
+    results = {}
+    state = dict(index=None, default=None)
+    state_lock = threading.Lock()
+
+    def existing_stores():
+        with state_lock:
+            if state["index"] is None:
+                # taken once: the uploads of this very ingest invalidate it
+                state["index"] = catalog._index(build_store_index, STORES)
+            return state["index"]
+
+    def resolve(workspace):
+        if isinstance(workspace, basestring):
+            return Workspace(catalog, workspace)
+        if workspace is None:
+            with state_lock:
+                if state["default"] is None:
+                    state["default"] = catalog.get_default_workspace()
+                return state["default"]
+        return workspace
+
+    def prepare(index, job):
+        name, data, workspace = job
+        result = IngestResult(name, None, _kind(data))
+        results[index] = result
+        started = time.time()
+        try:
+            workspace = resolve(workspace)
+            result.workspace = workspace.name
+            stores = None
+            if catalog.upload_manifest is not None:
+                stores = existing_stores()
+            dedup, unchanged = catalog._check_upload(workspace.name, name, name,
+                    data, [("kind", result.kind), ("charset", None)], stores)
+            if unchanged:
+                result.check_time = time.time() - started
+                result.upload = UploadResult.skip(
+                        _store_href(catalog, result.kind, workspace, name))
+                return None
+            if not overwrite and any(ws == workspace.name
+                    for ws, kind in existing_stores().get(name, ())):
+                raise ConflictingDataError("There is already a store named %s in %s"
+                        % (name, workspace.name))
+            result.check_time = time.time() - started
+            if isinstance(data, dict):
+                body, bundle_time = catalog._bundle(name, data, compression)
+            elif isinstance(data, basestring):
+                body, bundle_time = open(data, "rb"), 0.0
+            else:
+                body, bundle_time = data, 0.0
+        except Exception, e:
+            logger.debug("ingest of %s failed: %s", name, e)
+            result.error = e
+            return None
+        return _Prepared(result, workspace, data, body, bundle_time, dedup)
+
+    def bundle():
+        while True:
+            with jobs_lock:
+                try:
+                    index, job = next(jobs)
+                except StopIteration:
+                    return
+            prepared = prepare(index, job)
+            if prepared is not None:
+                ready.put(prepared)
+
+    def upload():
+        while True:
+            prepared = ready.get()
+            if prepared is None:
+                return
+            result = prepared.result
+            result.queue_time = time.time() - prepared.queued
+            report = None
+            if progress is not None:
+                report = lambda upload: progress(result.name, upload)
+            try:
+                if result.kind == "dataStore":
+                    send = lambda: catalog._upload_featurestore(result.name,
+                            prepared.body, prepared.workspace, None, report,
+                            prepared.bundle_time)
+                else:
+                    send = lambda: catalog._upload_coveragestore(result.name,
+                            prepared.body, prepared.workspace,
+                            isinstance(prepared.data, dict) and "tfw" in prepared.data,
+                            report, prepared.bundle_time)
+                result.upload = catalog._track_upload(prepared.dedup, send)
+            except Exception, e:
+                logger.debug("upload of %s failed: %s", result.name, e)
+                result.error = e
+            finally:
+                prepared.close()
+
+    bundler_threads = [threading.Thread(target=bundle) for i in range(max(1, bundlers))]
+    upload_threads = [threading.Thread(target=upload) for i in range(max_workers)]
+    for thread in bundler_threads + upload_threads:
+        thread.daemon = True
+        thread.start()
+    for thread in bundler_threads:
+        thread.join()
+    for thread in upload_threads:
+        ready.put(None)
+    for thread in upload_threads:
+        thread.join()
+    return [results[i] for i in sorted(results)]
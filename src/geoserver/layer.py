@@ -2,8 +2,44 @@ from geoserver.support import ResourceInfo, atom_link, atom_link_xml, \
         xml_property, write_bool, write_string
 from geoserver.style import Style
 from geoserver.resource import FeatureType, Coverage 
+from geoserver.store import DataStore, CoverageStore
+from geoserver.workspace import Workspace
 
 from collections import namedtuple
+from urllib import unquote
+import re
+
+_resource_link = re.compile(
+    r"/workspaces/([^/]+)/(datastores|coveragestores)/([^/]+)/(featuretypes|coverages)/([^/]+)\.xml$")
+
+def resource_key(href):
+    """
+    Identify a featuretype or coverage by the (workspace, store type, store,
+    name) path in its href, or return None if the href isn't one we
+    recognize.  Only the path is examined, since GeoServer may write links
+    against a proxy base url rather than the catalog's service url.
+    """
+    match = _resource_link.search(href.split("?")[0])
+    if match is None:
+        return None
+    ws, stores, store, resources, name = map(unquote, match.groups())
+    return (ws, stores, store, name)
+
+def _resource_from_link(catalog, href):
+    """
+    Build the FeatureType or Coverage (with its store and workspace) that a
+    layer's resource link points at, or None if the link isn't one we
+    recognize.
+    """
+    key = resource_key(href)
+    if key is None:
+        return None
+    ws, stores, store, name = key
+    workspace = Workspace(catalog, ws)
+    if stores == "datastores":
+        return FeatureType(catalog, workspace, DataStore(catalog, workspace, store), name)
+    else:
+        return Coverage(catalog, workspace, CoverageStore(catalog, workspace, store), name)
 
 class _attribution(object):
     def __init__(self, title, width, height):
@@ -62,6 +98,8 @@ def _write_alternate_styles(builder, styles):
 
 
 class Layer(ResourceInfo):
+    __slots__ = ("name",)
+
     def __init__(self, catalog, name):
         super(Layer, self).__init__()
         self.catalog = catalog
@@ -74,19 +112,35 @@ class Layer(ResourceInfo):
     def href(self):
         return "%s/layers/%s.xml" % (self.catalog.service_url, self.name)
 
+    @property
+    def resource_href(self):
+        """
+        The url of this layer's resource as linked from the layer document,
+        or None if the document has no link.
+        """
+        if self.dom is None:
+            self.fetch()
+        link = self._find("resource/{http://www.w3.org/2005/Atom}link")
+        return link.get("href") if link is not None else None
+
     @property
     def resource(self):
         if self.dom is None: 
             self.fetch()
-        name = self.dom.find("resource/name").text
+        href = self.resource_href
+        if href is not None:
+            resource = _resource_from_link(self.catalog, href)
+            if resource is not None:
+                return resource
+        name = self._find("resource/name").text
         return self.catalog.get_resource(name)
 
     def _get_default_style(self):
-        if 'default_style' in self.dirty:
-            return self.dirty['default_style']
+        if self._changed('default_style'):
+            return self._dirty['default_style']
         if self.dom is None:
             self.fetch()
-        name = self.dom.find("defaultStyle/name")
+        name = self._find("defaultStyle/name")
         # aborted data uploads can result in no default style
         if name is not None:
             return self.catalog.get_style(name.text)
@@ -99,8 +153,8 @@ class Layer(ResourceInfo):
         self.dirty["default_style"] = style
 
     def _get_alternate_styles(self):
-        if "alternate_styles" in self.dirty:
-            return self.dirty["alternate_styles"]
+        if self._changed("alternate_styles"):
+            return self._dirty["alternate_styles"]
         if self.dom is None:
             self.fetch()
         styles = self.dom.findall("styles/style/name")
@@ -38,6 +38,7 @@ def _write_styles(builder, styles):
     builder.end("styles")
 
 class LayerGroup(ResourceInfo):
+    __slots__ = ("name",)
     resource_type = "layerGroup"
     save_method = "PUT"
 
@@ -0,0 +1,57 @@
+"""
+A local record of what has been uploaded, so that unchanged data isn't
+bundled and sent again.
+"""
+from datetime import datetime
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger("gsconfig.manifest")
+
+class UploadManifest(object):
+    """
+    A JSON file mapping upload keys ("workspace/store/name") to the content
+    digest (see geoserver.bundle.bundle_digest) of the last data uploaded
+    there successfully.  Every change is written straight back to the file,
+    by way of a temporary file so that a crash can't leave it half written.
+    A missing or unreadable file counts as an empty manifest.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = dict()
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self._entries = json.load(f)
+            except (IOError, ValueError), e:
+                logger.warning("ignoring unreadable upload manifest %s: %s", path, e)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        return entry["digest"] if entry is not None else None
+
+    def put(self, key, digest):
+        with self._lock:
+            self._entries[key] = dict(digest=digest,
+                    uploaded=datetime.now().isoformat())
+            self._write()
+
+    def discard(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._write()
+
+    def _write(self):
+        temp = "%s.%d.tmp" % (self.path, os.getpid())
+        with open(temp, "w") as f:
+            json.dump(self._entries, f, indent=1, sort_keys=True)
+        os.rename(temp, self.path)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
@@ -45,6 +45,7 @@ def coverage_from_index(catalog, workspace, store, node):
     return Coverage(catalog, workspace, store, name.text)
 
 class FeatureType(ResourceInfo):
+    __slots__ = ("workspace", "store", "name")
     resource_type = "featureType"
     save_method = "PUT"
 
@@ -135,6 +136,8 @@ def coverage_dimension_xml(builder, dimension):
     builder.end("coverageDimension")
 
 class Coverage(ResourceInfo):
+    __slots__ = ("workspace", "store", "name")
+
     def __init__(self, catalog, workspace, store, name):
         super(Coverage, self).__init__()
         self.catalog = catalog
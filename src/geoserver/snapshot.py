@@ -0,0 +1,111 @@
+from datetime import datetime
+from urllib import quote_plus
+from geoserver.store import datastore_from_index, coveragestore_from_index
+from geoserver.support import parallel_map
+from geoserver.workspace import workspace_from_index
+
+def _names(tree, tag):
+    return tuple(n.find("name").text for n in tree.findall(tag))
+
+class CatalogSnapshot(object):
+    """
+    A point-in-time copy of the catalog's listings: the workspace index, the
+    store listings of each workspace, the resource listings of each store,
+    and the layer, layergroup and style indexes.  While the snapshot is
+    installed on its catalog (see Catalog.snapshot), get_xml answers for all
+    of these from the snapshot without touching the network, so the get_*
+    methods walk the catalog in memory.
+
+    The documents and the indexes built from them are never modified; a
+    write through the catalog uninstalls the snapshot instead.
+    """
+    def __init__(self, catalog, documents, stores):
+        self.catalog = catalog
+        self.taken = datetime.now()
+        self._documents = dict(
+            (quote_plus(url, ":/"), tree) for url, tree in documents)
+
+        by_url = dict(documents)
+        rest = catalog.service_url
+        self.workspaces = _names(by_url["%s/workspaces.xml" % rest], "workspace")
+        self.layers = _names(by_url["%s/layers.xml" % rest], "layer")
+        self.layergroups = _names(by_url["%s/layergroups.xml" % rest], "layerGroup")
+        self.styles = _names(by_url["%s/styles.xml" % rest], "style")
+
+        self._stores = dict((ws, ()) for ws in self.workspaces)
+        self._resources = dict()
+        for store in stores:
+            ws = store.workspace.name
+            self._stores[ws] += ((store.name, store.resource_type),)
+            tag = "featureType" if store.resource_type == "dataStore" else "coverage"
+            self._resources[(ws, store.name)] = _names(by_url[store.resource_url], tag)
+
+    def document(self, url):
+        """
+        The parsed listing for a (quoted) url, or None if it isn't part of
+        the snapshot.
+        """
+        return self._documents.get(url)
+
+    def stores(self, workspace=None):
+        """
+        (workspace, name, kind) for every store, or for the stores in one
+        workspace.  kind is the store's resource_type: "dataStore" or
+        "coverageStore".
+        """
+        workspaces = self.workspaces if workspace is None else (workspace,)
+        return tuple((ws, name, kind)
+                for ws in workspaces for name, kind in self._stores.get(ws, ()))
+
+    def resources(self, workspace=None, store=None):
+        """
+        (workspace, store, name) for every featuretype and coverage, narrowed
+        down to one workspace and/or store if given.
+        """
+        return tuple((ws, st, name)
+                for ws, st, kind in self.stores(workspace)
+                if store is None or st == store
+                for name in self._resources[(ws, st)])
+
+    def __contains__(self, url):
+        return url in self._documents
+
+    def __repr__(self):
+        return "<CatalogSnapshot of %s taken %s>" % (
+                self.catalog.service_url, self.taken)
+
+def take_snapshot(catalog, max_workers=None):
+    """
+    Fetch every listing a CatalogSnapshot covers: the catalog-wide indexes,
+    then the store listings of all workspaces, then the resource listings.
+    """
+    def fetch(url):
+        return (url, catalog.get_xml(url))
+
+    def fetch_all(urls):
+        if max_workers is None:
+            return catalog._map(fetch, urls)
+        else:
+            return parallel_map(fetch, urls, max_workers)
+
+    rest = catalog.service_url
+    indexes = fetch_all(["%s/%s.xml" % (rest, n) for n in
+        ("workspaces", "layers", "layergroups", "styles")])
+    workspaces = [workspace_from_index(catalog, n)
+            for n in indexes[0][1].findall("workspace")]
+
+    store_urls = []
+    for ws in workspaces:
+        store_urls.extend([ws.datastore_url, ws.coveragestore_url])
+    listings = fetch_all(store_urls)
+
+    stores = []
+    for ws, (ds_url, ds_list), (cs_url, cs_list) in zip(
+            workspaces, listings[0::2], listings[1::2]):
+        stores.extend(datastore_from_index(catalog, ws, n)
+                for n in ds_list.findall("dataStore"))
+        stores.extend(coveragestore_from_index(catalog, ws, n)
+                for n in cs_list.findall("coverageStore"))
+    resources = fetch_all([s.resource_url for s in stores])
+
+    return CatalogSnapshot(catalog, indexes + listings + resources, stores)
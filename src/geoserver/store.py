@@ -12,6 +12,7 @@ def coveragestore_from_index(catalog, workspace, node):
     return CoverageStore(catalog, workspace, name.text)
 
 class DataStore(ResourceInfo):
+    __slots__ = ("workspace", "name")
     resource_type = "dataStore"
     save_method = "PUT"
 
@@ -29,7 +30,6 @@ class DataStore(ResourceInfo):
         return "%s/workspaces/%s/datastores/%s.xml" % (self.catalog.service_url, self.workspace.name, self.name)
 
     enabled = xml_property("enabled", lambda x: x.text == "true")
-    name = xml_property("name")
     connection_parameters = xml_property("connectionParameters", key_value_pairs)
 
     writers = dict(enabled = write_bool("enabled"),
@@ -37,13 +37,16 @@ class DataStore(ResourceInfo):
                    connectionParameters = write_dict("connectionParameters"))
 
 
-    def get_resources(self):
-        res_url = "%s/workspaces/%s/datastores/%s/featuretypes.xml" % (
+    @property
+    def resource_url(self):
+        return "%s/workspaces/%s/datastores/%s/featuretypes.xml" % (
                    self.catalog.service_url,
                    self.workspace.name,
                    self.name
                 )
-        xml = self.catalog.get_xml(res_url)
+
+    def get_resources(self):
+        xml = self.catalog.get_xml(self.resource_url)
         def ft_from_node(node):
             return featuretype_from_index(self.catalog, self.workspace, self, node)
 
@@ -62,6 +65,7 @@ class UnsavedDataStore(DataStore):
         return "%s/workspaces/%s/datastores?name=%s" % (self.catalog.service_url, self.workspace.name, self.name)
 
 class CoverageStore(ResourceInfo):
+    __slots__ = ("workspace", "name")
     resource_type = 'coverageStore'
     save_method = "PUT"
 
@@ -80,7 +84,6 @@ class CoverageStore(ResourceInfo):
         return "%s/workspaces/%s/coveragestores/%s.xml" % (self.catalog.service_url, self.workspace.name, self.name)
 
     enabled = xml_property("enabled", lambda x: x.text == "true")
-    name = xml_property("name")
     url = xml_property("url")
     type = xml_property("type")
 
@@ -90,14 +93,16 @@ class CoverageStore(ResourceInfo):
                    type = write_string("type"))
 
 
-    def get_resources(self):
-        res_url = "%s/workspaces/%s/coveragestores/%s/coverages.xml" % (
+    @property
+    def resource_url(self):
+        return "%s/workspaces/%s/coveragestores/%s/coverages.xml" % (
                   self.catalog.service_url,
                   self.workspace.name,
                   self.name
                 )
 
-        xml = self.catalog.get_xml(res_url)
+    def get_resources(self):
+        xml = self.catalog.get_xml(self.resource_url)
 
         def cov_from_node(node):
             name = node.find("name")
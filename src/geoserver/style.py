@@ -2,6 +2,8 @@ from geoserver.support import ResourceInfo, atom_link, xml_property
 import re
 
 class Style(ResourceInfo):
+    __slots__ = ("name", "_sld_dom")
+
     def __init__(self, catalog, name):
         super(Style, self).__init__()
         assert isinstance(name, basestring)
@@ -45,6 +47,8 @@ class Style(ResourceInfo):
         headers = { "Content-Type": "application/vnd.ogc.sld+xml" }
         response, content = self.catalog.http.request(
                 self.body_href(), "PUT", body, headers)
+        self.catalog._invalidate(self.href)
+        self._sld_dom = None
 
 # class Style(ResourceInfo):
 #   def __init__(self,catalog, node):
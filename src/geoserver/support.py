@@ -1,7 +1,10 @@
 import logging
+import os
+from multiprocessing.pool import ThreadPool
 from xml.etree.ElementTree import TreeBuilder, tostring
 from tempfile import mkstemp
-from zipfile import ZipFile
+from urlparse import parse_qs
+from geoserver.bundle import BundleStream
 
 
 logger = logging.getLogger("gsconfig.support")
@@ -27,15 +30,97 @@ information from the underlying storage mechanism to reproject to the
 configured projection.
 """
 
+DEFAULT_MAX_WORKERS = 8
+"""
+How many requests the catalog will have in flight at once when it fans a
+walk out over several threads.
+"""
+
+MIN_PARALLEL_ITEMS = 3
+"""
+parallel_map makes the calls one after the other when there are fewer
+items than this: handing a couple of calls to other threads costs more
+than it saves when they are answered from the cache, as they often are.
+"""
+
+def parallel_map(function, items, max_workers=DEFAULT_MAX_WORKERS, executor=None):
+    """
+    Like map(), but calls function from up to max_workers threads at once.
+    Results come back in the order of items, and the first exception raised
+    by any call is re-raised in the caller.  Fewer than MIN_PARALLEL_ITEMS
+    items are mapped in the calling thread.
+
+    If an executor is given (anything with a map(function, items) method,
+    such as a multiprocessing.pool.ThreadPool) the calls are handed to it
+    instead, and max_workers is ignored.  Otherwise a pool is started and
+    joined for the call, which takes about a tenth of a second on Python 2;
+    callers that map often should keep a pool and pass it as executor.
+    """
+    items = list(items)
+    if len(items) < MIN_PARALLEL_ITEMS:
+        return map(function, items)
+    if executor is not None:
+        return list(executor.map(function, items))
+    if max_workers is None or max_workers <= 1:
+        return map(function, items)
+    pool = ThreadPool(min(max_workers, len(items)))
+    try:
+        return pool.map(function, items)
+    finally:
+        pool.close()
+        pool.join()
+
+class SaveResult(object):
+    """
+    The outcome of saving one object as part of a batch (see
+    Catalog.save_all and Changeset.flush.)  status is the HTTP status code,
+    or None if no response came back, in which case error says why: the
+    exception raised, or the failed write the object depended on.  For
+    requests the server refused, error holds the body of its response.
+    attempts is the number of times the request was sent.
+    """
+    def __init__(self, obj, status=None, error=None):
+        self.obj = obj
+        self.status = status
+        self.error = error
+        self.attempts = 1
+
+    @property
+    def success(self):
+        return self.status is not None and 200 <= self.status < 300
+
+    def __nonzero__(self):
+        return self.success
+
+    def __repr__(self):
+        return "<SaveResult %s %s %s>" % (
+                self.obj.href, self.status, "ok" if self.success else "failed")
+
 def xml_property(path, converter = lambda x: x.text):
+    """
+    A property read from the node at path in the object's document, or
+    from its unsaved changes once it has been set.  The converted value is
+    kept until the document is replaced, so reading a property again
+    doesn't walk or convert the document again; lists and dicts are handed
+    out as copies, so changing one doesn't change the property.
+    """
     def get(self):
-        if path in self.dirty:
-            return self.dirty[path]
+        if self._changed(path):
+            return self._dirty[path]
+        if self.dom is None:
+            self.fetch()
+        # taken before reading, so a value read from a document that has
+        # since been replaced goes into the old memo, not the new one
+        values = self._values
+        if values is None:
+            values = self._values = dict()
+        if path in values:
+            value = values[path]
         else:
-            if self.dom is None:
-                self.fetch()
-            node = self.dom.find(path)
-            return converter(self.dom.find(path)) if node is not None else None
+            node = self._find(path)
+            value = converter(node) if node is not None else None
+            values[path] = value
+        return _copied(value)
 
     def set(self, value):
         self.dirty[path] = value
@@ -45,6 +130,40 @@ def xml_property(path, converter = lambda x: x.text):
 
     return property(get, set, delete)
 
+def _copied(value):
+    if isinstance(value, list):
+        return list(value)
+    elif isinstance(value, dict):
+        return dict(value)
+    return value
+
+def index_dom(dom):
+    """
+    Map the paths of the children and grandchildren of a document's root
+    ("name", "resource/name") to the first node at each, so the usual
+    lookups don't each walk the document.
+    """
+    nodes = dict()
+    if dom is not None:
+        for child in dom:
+            nodes.setdefault(child.tag, child)
+            for grandchild in child:
+                nodes.setdefault(child.tag + "/" + grandchild.tag, grandchild)
+    return nodes
+
+def object_url(href):
+    """
+    The url of the object an href refers to, without its extension: unsaved
+    objects are POSTed to their parent listing with ?name=..., so for those
+    the name is appended to the listing's url instead.
+    """
+    url, _, query = href.partition("?")
+    url = os.path.splitext(url.rstrip("/"))[0]
+    name = parse_qs(query).get("name")
+    if name:
+        url = "%s/%s" % (url, name[0])
+    return url
+
 def bbox(node):
     if node is not None: 
         minx = node.find("minx")
@@ -116,15 +235,72 @@ def write_dict(name):
     return write
 
 class ResourceInfo(object):
+    """
+    The base of the catalog objects.  These are made by the thousand for
+    catalog listings, so they use __slots__ (subclasses declare their own)
+    and allocate nothing beyond their identifying attributes until they are
+    fetched or modified: the document index, the memo of values read from
+    it and the dirty dict of unsaved changes all start out as None.
+    """
+    __slots__ = ("catalog", "_dom", "_nodes", "_values", "_dirty")
+
     def __init__(self):
-        self.dom = None
-        self.dirty = dict()
+        self._dom = None
+        self._nodes = None
+        self._values = None
+        self._dirty = None
+
+    def _get_dom(self):
+        return self._dom
+
+    def _set_dom(self, dom):
+        # a new revision of the document: index it, and forget the values
+        # read from the old one
+        self._dom = dom
+        self._nodes = index_dom(dom)
+        self._values = None
+
+    dom = property(_get_dom, _set_dom)
+
+    def _get_dirty(self):
+        if self._dirty is None:
+            self._dirty = dict()
+        return self._dirty
+
+    def _set_dirty(self, dirty):
+        self._dirty = dirty
+
+    dirty = property(_get_dirty, _set_dirty, doc="""
+        The unsaved changes, by the names their writers go by.  Created
+        the first time it is used; to look at it without creating it, use
+        modified and _changed.""")
+
+    @property
+    def modified(self):
+        """
+        Whether the object has unsaved changes.
+        """
+        return bool(self._dirty)
+
+    def _changed(self, key):
+        return self._dirty is not None and key in self._dirty
+
+    def _find(self, path):
+        """
+        The node at path in the document (which must have been fetched), or
+        None.
+        """
+        node = self._nodes.get(path) if self._nodes else None
+        if node is None and self._dom is not None:
+            node = self._dom.find(path)
+        return node
 
     def fetch(self):
         self.dom = self.catalog.get_xml(self.href)
 
     def clear(self):
-        self.dirty = dict()
+        self._dirty = None
+        self._values = None
 
     def refresh(self):
         self.clear()
@@ -137,8 +313,8 @@ class ResourceInfo(object):
             self.enabled = self.enabled
 
         for k, writer in self.writers.items():
-            if k in self.dirty:
-                writer(builder, self.dirty[k])
+            if self._changed(k):
+                writer(builder, self._dirty[k])
 
     def message(self):
         builder = TreeBuilder()
@@ -148,7 +324,7 @@ class ResourceInfo(object):
         msg = tostring(builder.close())
         return msg
                 
-def prepare_upload_bundle(name, data):
+def prepare_upload_bundle(name, data, compression=None):
     """GeoServer's REST API uses ZIP archives as containers for file formats such
     as Shapefile and WorldImage which include several 'boxcar' files alongside
     the main data.  In such archives, GeoServer assumes that all of the relevant
@@ -156,16 +332,14 @@ def prepare_upload_bundle(name, data):
     the root of the ZIP archive.  This method produces a zip file that matches
     these expectations, based on a basename, and a dict of extensions to paths or
     file-like objects. The client code is responsible for deleting the zip
-    archive when it's done."""
-    handle, f = mkstemp() # we don't use the file handle directly. should we?
-    zip = ZipFile(f, 'w')
-    for ext, stream in data.iteritems():
-        fname = "%s.%s" % (name, ext)
-        if (isinstance(stream, basestring)):
-            zip.write(stream, fname)
-        else:
-            zip.writestr(fname, stream.read())
-    zip.close()
+    archive when it's done.  Members are stored uncompressed unless
+    compression maps their extension to ZIP_DEFLATED.  To send an
+    archive without writing it to disk first, use a
+    geoserver.bundle.BundleStream."""
+    handle, f = mkstemp()
+    with os.fdopen(handle, "wb") as archive:
+        for piece in BundleStream(name, data, compression=compression):
+            archive.write(piece)
     return f
 
 def atom_link(node):
@@ -0,0 +1,408 @@
+from httplib import HTTPException
+import logging
+import os
+import random
+import socket
+import threading
+import time
+
+logger = logging.getLogger("gsconfig.transport")
+
+DEFAULT_POOL_SIZE = 10
+"""
+The most httplib2.Http objects (and so keep-alive connections per host) a
+catalog holds at once unless told otherwise.
+"""
+
+DEFAULT_IDLE_TIMEOUT = 60
+"""
+How many seconds a pooled connection may sit unused before it is closed
+rather than reused.
+"""
+
+PROGRESS_INTERVAL = 0.25
+"""
+The least number of seconds between two calls to an upload's progress
+callback, other than the last.
+"""
+
+DEFAULT_RETRY_STATUSES = (429, 502, 503, 504)
+"""
+HTTP status codes that mark a failure as likely to be transient: the
+server is overloaded, or a proxy in front of it couldn't reach it.  500 is
+left out: GeoServer answers 500 for most requests it can't carry out
+(malformed XML, a missing file, a broken store), which fail the same way
+every time, so retrying them only delays the error.  A RetryPolicy can
+be given statuses that include it for servers where 500s come and go.
+"""
+
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+"""
+The methods a RetryPolicy retries unless told otherwise.  Sending one of
+these twice has the same effect as sending it once; a POST might create a
+second object, so it isn't retried.
+"""
+
+_RETRYABLE_ERRORS = (socket.error, HTTPException)
+
+class RetryPolicy(object):
+    """
+    When and how often a ConnectionPool repeats a failed request.  A request
+    is tried up to max_attempts times in all, if its method is one of
+    methods and it failed with a connection error or one of the statuses
+    given.  Before attempt n + 1 the pool waits backoff * 2 ** (n - 1)
+    seconds, capped at max_backoff and shortened by a random fraction of up
+    to jitter, so that clients that failed together don't retry together;
+    a Retry-After header from the server lengthens the wait if need be.
+
+    A request body is only sent again if it can be replayed: a string, or
+    an object with a rewind() method that returns True.
+    """
+    def __init__(self, max_attempts=3, backoff=0.5, max_backoff=30, jitter=0.5,
+            statuses=DEFAULT_RETRY_STATUSES, methods=IDEMPOTENT_METHODS):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.statuses = frozenset(statuses)
+        self.methods = frozenset(m.upper() for m in methods)
+
+    def retries(self, method):
+        return self.max_attempts > 1 and method.upper() in self.methods
+
+    def delay(self, attempt, response=None):
+        """
+        Seconds to wait after the given (1-based) failed attempt.
+        """
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        delay *= 1 - random.uniform(0, self.jitter)
+        retry_after = response.get("retry-after") if response is not None else None
+        if retry_after is not None and retry_after.strip().isdigit():
+            delay = max(delay, min(self.max_backoff, int(retry_after)))
+        return delay
+
+NO_RETRY = RetryPolicy(max_attempts=1)
+"""
+A RetryPolicy that sends every request once only.
+"""
+
+def _rewind(body):
+    # whether body can be sent again, rewinding it if need be
+    if body is None or isinstance(body, basestring):
+        return True
+    rewind = getattr(body, "rewind", None)
+    try:
+        return rewind is not None and rewind()
+    except (IOError, OSError, ValueError), e:
+        logger.debug("can't rewind request body: %s", e)
+        return False
+
+def _close(http):
+    for conn in http.connections.values():
+        conn.close()
+    http.connections.clear()
+
+class ConnectionPool(object):
+    """
+    A bounded pool of httplib2.Http objects, each holding its own keep-alive
+    connections.  An httplib2.Http can only serve one request at a time, so
+    every request checks one out of the pool for its duration: the most
+    recently returned one if any (its connection is the likeliest to still
+    be open), a new one if the pool is below its size, or else the first one
+    another thread gives back.  Idle objects older than idle_timeout seconds
+    are closed instead of reused.
+
+    The pool offers the same request() method as httplib2.Http, so it can
+    stand in for one.  Failed requests are repeated as the retry policy
+    allows (see RetryPolicy); the response finally returned, or the error
+    finally raised, has an attempts attribute saying how many tries it
+    took.  stats counts how many Http objects were created, how many
+    checkouts reused an existing one, how many were discarded (idle too
+    long, or broken by an error), how often a caller had to wait for a
+    free one and how many requests were retried.
+    """
+    def __init__(self, factory, size=DEFAULT_POOL_SIZE,
+            idle_timeout=DEFAULT_IDLE_TIMEOUT, retry=None):
+        self.factory = factory
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.stats = dict(created=0, reused=0, discarded=0, waited=0, retried=0)
+        self._idle = []
+        self._live = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                now = time.time()
+                while self._idle:
+                    http, last_used = self._idle.pop()
+                    if now - last_used <= self.idle_timeout:
+                        self.stats["reused"] += 1
+                        return http
+                    self._discard(http)
+                if self._live < self.size:
+                    self._live += 1
+                    self.stats["created"] += 1
+                    break
+                self.stats["waited"] += 1
+                self._cond.wait()
+        try:
+            return self.factory()
+        except:
+            with self._cond:
+                self._live -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, http):
+        with self._cond:
+            self._idle.append((http, time.time()))
+            self._cond.notify()
+
+    def discard(self, http):
+        with self._cond:
+            self._discard(http)
+            self._cond.notify()
+
+    def _discard(self, http):
+        _close(http)
+        self._live -= 1
+        self.stats["discarded"] += 1
+
+    def _send(self, fresh, uri, method, body, headers, **kwargs):
+        http = self.acquire()
+        if fresh:
+            _close(http)
+        try:
+            result = http.request(uri, method, body, headers, **kwargs)
+        except:
+            # the connection may be left half-read; don't hand it out again
+            self.discard(http)
+            raise
+        self.release(http)
+        return result
+
+    def _retrying(self, fresh, uri, method="GET", body=None, headers=None, **kwargs):
+        policy = self.retry
+        retries = policy.retries(method)
+        attempt = 1
+        while True:
+            response = None
+            try:
+                response, content = self._send(fresh, uri, method, body, headers, **kwargs)
+            except _RETRYABLE_ERRORS, e:
+                if not retries or attempt >= policy.max_attempts or not _rewind(body):
+                    e.attempts = attempt
+                    raise
+                logger.debug("%s %s failed (%s), retrying", method, uri, e)
+            else:
+                if response.status not in policy.statuses or not retries or \
+                        attempt >= policy.max_attempts or not _rewind(body):
+                    response.attempts = attempt
+                    return response, content
+                logger.debug("%s %s got %d, retrying", method, uri, response.status)
+            with self._cond:
+                self.stats["retried"] += 1
+            time.sleep(policy.delay(attempt, response))
+            attempt += 1
+
+    def request(self, *args, **kwargs):
+        return self._retrying(False, *args, **kwargs)
+
+    def stream(self, *args, **kwargs):
+        """
+        Like request(), but over a newly opened connection, for bodies that
+        can only be read once.  httplib2 sends the body again when a reused
+        keep-alive connection turns out to have been closed by the server,
+        which a half-read stream can't survive.
+        """
+        return self._retrying(True, *args, **kwargs)
+
+    def close(self):
+        """
+        Close every idle connection.  Ones in use at the time go back into
+        the pool as usual when their requests finish.
+        """
+        with self._cond:
+            while self._idle:
+                http, last_used = self._idle.pop()
+                self._discard(http)
+
+    def __repr__(self):
+        return "<ConnectionPool size=%d live=%d idle=%d %r>" % (
+                self.size, self._live, len(self._idle), self.stats)
+
+class UploadResult(object):
+    """
+    What an upload sent and how long it took, in seconds, split by phase:
+
+    bundle_time   building the request body: zipping a bundle up front, or
+                  reading (and zipping) a streamed one while it is sent
+    transfer_time from the first byte of the body to the last
+    server_time   from the last byte sent until the server's response
+                  arrived; GeoServer unpacks and configures the data here
+
+    Streamed bundles are built during the transfer, so their bundle_time
+    overlaps transfer_time; elapsed is the wall time of the whole upload,
+    bundling included.  attempts counts the times the body was sent (see
+    RetryPolicy); the other numbers are for the last of them, except
+    bundle_time, which covers them all.  skipped is True when nothing was
+    sent because the catalog's upload manifest showed the data was there
+    already; url is then the store's.  total_bytes is None when the size
+    wasn't known up front, and status is None until the response is in.
+    The same object, partly filled in, is passed to progress callbacks
+    while the upload runs.
+    """
+    def __init__(self, url, total_bytes=None, bundle_time=0.0):
+        self.url = url
+        self.status = None
+        self.bytes_sent = 0
+        self.total_bytes = total_bytes
+        self.bundle_time = bundle_time
+        self.transfer_time = 0.0
+        self.server_time = 0.0
+        self.elapsed = bundle_time
+        self.attempts = 1
+        self.skipped = False
+
+    @classmethod
+    def skip(cls, url):
+        result = cls(url, 0)
+        result.attempts = 0
+        result.skipped = True
+        return result
+
+    @property
+    def rate(self):
+        """
+        Bytes sent per second of transfer so far.
+        """
+        if self.transfer_time <= 0:
+            return 0.0
+        return self.bytes_sent / self.transfer_time
+
+    def as_dict(self):
+        return dict(url=self.url, status=self.status,
+                bytes_sent=self.bytes_sent, total_bytes=self.total_bytes,
+                bundle_time=self.bundle_time, transfer_time=self.transfer_time,
+                server_time=self.server_time, elapsed=self.elapsed,
+                rate=self.rate, attempts=self.attempts, skipped=self.skipped)
+
+    def __repr__(self):
+        if self.skipped:
+            return "<UploadResult %s skipped, unchanged>" % self.url
+        return "<UploadResult %s %s %d bytes in %.2fs (%.0f bytes/s)>" % (
+                self.url, self.status, self.bytes_sent, self.elapsed, self.rate)
+
+def _body_size(body):
+    if isinstance(body, basestring):
+        return len(body)
+    try:
+        return os.fstat(body.fileno()).st_size - body.tell()
+    except (AttributeError, IOError, OSError, ValueError):
+        return None
+
+class MeteredBody(object):
+    """
+    A request body (a string or file-like object) that keeps an
+    UploadResult up to date as httplib reads it, calling progress with that
+    result every PROGRESS_INTERVAL seconds and once at the end.  Bodies of
+    unknown size are framed for chunked transfer-encoding.  headers() gives
+    the Content-Length or Transfer-Encoding header to send with it.
+
+    rewind() readies the body to be sent again, if the one it wraps is a
+    string, a file it can seek back in, or has a rewind() of its own.  A
+    string body read again after its end starts over by itself, as httplib2
+    needs when it resends a request over a new connection, so such bodies
+    may go out over pooled connections (see replayable).
+    """
+    def __init__(self, body, result, progress=None):
+        self.body = body
+        self.result = result
+        self.progress = progress
+        self.chunked = result.total_bytes is None
+        try:
+            self._start = body.tell()
+        except (AttributeError, IOError, OSError, ValueError):
+            self._start = None
+        self._offset = 0
+        self._created = time.time()
+        self._prepared = result.elapsed
+        self._started = None
+        self._finished = None
+        self._reported = 0
+
+    @classmethod
+    def wrap(cls, url, body, progress=None, bundle_time=0.0):
+        return cls(body, UploadResult(url, _body_size(body), bundle_time), progress)
+
+    @property
+    def replayable(self):
+        return isinstance(self.body, basestring)
+
+    def headers(self):
+        if self.chunked:
+            return {"Transfer-Encoding": "chunked"}
+        return {"Content-Length": str(self.result.total_bytes)}
+
+    def _read(self, size):
+        if isinstance(self.body, basestring):
+            data = self.body[self._offset:self._offset + size]
+            self._offset += len(data)
+            return data
+        before = time.time()
+        data = self.body.read(size)
+        self.result.bundle_time += time.time() - before
+        return data
+
+    def read(self, size=8192):
+        if self._finished is not None:
+            if not self.replayable or not self.rewind():
+                return ""
+        now = time.time()
+        if self._started is None:
+            self._started = now
+        data = self._read(size)
+        now = time.time()
+        result = self.result
+        result.bytes_sent += len(data)
+        result.transfer_time = now - self._started
+        result.elapsed = self._prepared + now - self._created
+        if not data:
+            self._finished = now
+        if self.progress is not None and (
+                not data or now - self._reported >= PROGRESS_INTERVAL):
+            self._reported = now
+            self.progress(result)
+        if self.chunked:
+            return "%x\r\n%s\r\n" % (len(data), data) if data else "0\r\n\r\n"
+        return data
+
+    def rewind(self):
+        if isinstance(self.body, basestring):
+            self._offset = 0
+        elif hasattr(self.body, "rewind"):
+            if not self.body.rewind():
+                return False
+        elif self._start is not None and hasattr(self.body, "seek"):
+            self.body.seek(self._start)
+        else:
+            return False
+        self._started = self._finished = None
+        self.result.bytes_sent = 0
+        self.result.transfer_time = self.result.server_time = 0.0
+        self.result.attempts += 1
+        return True
+
+    def finish(self, status):
+        """
+        Record the server's response, arriving now.
+        """
+        now = time.time()
+        if self._finished is not None:
+            self.result.server_time = now - self._finished
+        self.result.elapsed = self._prepared + now - self._created
+        self.result.status = status
+        return self.result
@@ -1,4 +1,5 @@
-from geoserver.support import atom_link, xml_property, write_bool, ResourceInfo
+from geoserver.support import atom_link, xml_property, write_bool, \
+        write_string, ResourceInfo
 import string
 
 def workspace_from_index(catalog, node):
@@ -6,7 +7,9 @@ def workspace_from_index(catalog, node):
     return Workspace(catalog, name.text)
 
 class Workspace(ResourceInfo): 
+    __slots__ = ("name",)
     resource_type = "workspace"
+    save_method = "PUT"
 
     def __init__(self, catalog, name):
         super(Workspace, self).__init__()
@@ -32,3 +35,19 @@ class Workspace(ResourceInfo):
 
     def __repr__(self):
         return "%s @ %s" % (self.name, self.href)
+
+class UnsavedWorkspace(Workspace):
+    save_method = "POST"
+
+    def __init__(self, catalog, name):
+        super(UnsavedWorkspace, self).__init__(catalog, name)
+        # workspaces are created enabled; only the name is sent
+        self.dirty.update(name = name, enabled = True)
+
+    writers = dict(
+        name = write_string("name")
+    )
+
+    @property
+    def href(self):
+        return "%s/workspaces?name=%s" % (self.catalog.service_url, self.name)
@@ -0,0 +1,54 @@
+import threading
+import unittest
+from geoserver.asynccatalog import AsyncCatalog, gather
+from geoserver.catalog import ConflictingDataError, FailedRequestError
+from geoserver.layergroup import UnsavedLayerGroup
+from test.fakes import fake_catalog, ROOT
+
+LAYERGROUPS = """<layerGroups>
+  <layerGroup><name>base</name></layerGroup>
+</layerGroups>"""
+
+def style(name):
+  return "%s/styles/%s.xml" % (ROOT, name)
+
+class AsyncCatalogTests(unittest.TestCase):
+  def setUp(self):
+    names = ["a", "b", "c", "d"]
+    documents = dict((style(n), "<style><name>%s</name></style>" % n)
+        for n in names)
+    documents[ROOT + "/layergroups.xml"] = LAYERGROUPS
+    self.names = names
+    self.acat = AsyncCatalog(fake_catalog(documents), concurrency=4)
+
+  def tearDown(self):
+    self.acat.close()
+
+  def testResultsComeBackInCallOrder(self):
+    # the first lookup is held up until the last one has been asked for,
+    # so the answers finish out of order
+    last = threading.Event()
+    def on_request(method, url):
+      if url == style("d"):
+        last.set()
+      elif url == style("a"):
+        last.wait(5)
+    self.acat.catalog.http.on_request = on_request
+    styles = gather(self.acat.map("get_style", self.names))
+    self.assertEqual(self.names, [s.name for s in styles])
+
+  def testFailuresReachTheCaller(self):
+    pending = self.acat.map("get_xml", [style("a"), style("missing")])
+    self.assertEqual("a", pending[0].get(5).find("name").text)
+    self.assertRaises(FailedRequestError, pending[1].get, 5)
+    self.assertRaises(FailedRequestError, gather, pending, 5)
+
+  def testCreateLayerGroupIsDeferred(self):
+    group = self.acat.create_layergroup("roads").get(5)
+    self.assert_(isinstance(group, UnsavedLayerGroup))
+    self.assertRaises(ConflictingDataError,
+        self.acat.create_layergroup("base").get, 5)
+    self.assert_(self.acat.changeset().get(5) is not None)
+
+if __name__ == "__main__":
+  unittest.main()
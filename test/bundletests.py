@@ -0,0 +1,101 @@
+import os
+import tempfile
+import unittest
+from StringIO import StringIO
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
+import geoserver.bundle
+from geoserver.bundle import BundleStream, bundle_digest, bundle_size, \
+    VECTOR_COMPRESSION
+from geoserver.support import prepare_upload_bundle
+
+class BundleStreamTests(unittest.TestCase):
+  def setUp(self):
+    handle, self.path = tempfile.mkstemp()
+    os.write(handle, os.urandom(100000))
+    os.close(handle)
+
+  def tearDown(self):
+    os.unlink(self.path)
+
+  def testArchiveRoundTrip(self):
+    stream = BundleStream("states", {"shp": self.path, "dbf": StringIO("dbf " * 1000)},
+        chunk_size=1024)
+    pieces = []
+    while True:
+      piece = stream.read(500)
+      if not piece:
+        break
+      self.assert_(len(piece) <= 500)
+      pieces.append(piece)
+    archive = ZipFile(StringIO("".join(pieces)))
+    self.assertEqual(["states.dbf", "states.shp"], archive.namelist())
+    self.assertEqual(None, archive.testzip())
+    self.assertEqual(open(self.path, "rb").read(), archive.read("states.shp"))
+
+  def testRewind(self):
+    stream = BundleStream("states", {"shp": self.path, "dbf": StringIO("dbf")})
+    first = stream.read(1000)
+    self.assert_(stream.rewind())
+    self.assertEqual(first, stream.read(1000))
+    stream.read()
+    self.assert_(stream.rewind())
+    self.assertEqual(None, ZipFile(StringIO(stream.read())).testzip())
+
+    class Unseekable(object):
+      def read(self, size=-1):
+        return ""
+    self.assertEqual(False, BundleStream("states", {"dbf": Unseekable()}).rewind())
+
+  def testZip64Headers(self):
+    limit = geoserver.bundle._ZIP64_LIMIT
+    geoserver.bundle._ZIP64_LIMIT = 100
+    try:
+      body = BundleStream("states", {"shp": self.path, "prj": StringIO("GEOGCS")}).read()
+    finally:
+      geoserver.bundle._ZIP64_LIMIT = limit
+    archive = ZipFile(StringIO(body))
+    self.assertEqual(None, archive.testzip())
+    self.assertEqual("GEOGCS", archive.read("states.prj"))
+
+  def testCompressionByExtension(self):
+    body = BundleStream("states", {"shp": self.path, "dbf": StringIO("dbf " * 100)},
+        compression=VECTOR_COMPRESSION).read()
+    archive = ZipFile(StringIO(body))
+    self.assertEqual(ZIP_DEFLATED, archive.getinfo("states.shp").compress_type)
+    self.assertEqual(ZIP_DEFLATED, archive.getinfo("states.dbf").compress_type)
+    self.assertEqual(open(self.path, "rb").read(), archive.read("states.shp"))
+
+  def testGeoTiffsAreStored(self):
+    for compression in [None, VECTOR_COMPRESSION]:
+      body = BundleStream("dem", {"tif": self.path, "tfw": StringIO("1.0")},
+          compression=compression).read()
+      archive = ZipFile(StringIO(body))
+      self.assertEqual(ZIP_STORED, archive.getinfo("dem.tif").compress_type)
+      self.assertEqual(ZIP_STORED, archive.getinfo("dem.tfw").compress_type)
+      self.assertEqual(open(self.path, "rb").read(), archive.read("dem.tif"))
+
+  def testBundleSize(self):
+    self.assertEqual(100000, bundle_size({"shp": self.path}))
+    self.assertEqual(None, bundle_size({"shp": self.path, "dbf": StringIO("")}))
+
+  def testDigest(self):
+    dbf = StringIO("dbf")
+    dbf.read(1)
+    digest = bundle_digest({"shp": self.path, "dbf": dbf})
+    self.assertEqual(1, dbf.tell())
+    self.assertEqual(digest, bundle_digest({"shp": self.path, "dbf": StringIO("bf")}))
+    self.assertNotEqual(digest, bundle_digest({"shp": self.path, "dbf": StringIO("bf")},
+        [("charset", "UTF-8")]))
+    self.assertNotEqual(digest, bundle_digest({"shp": self.path, "prj": StringIO("bf")}))
+
+  def testPrepareUploadBundle(self):
+    bundle = prepare_upload_bundle("states", {"shp": self.path})
+    try:
+      self.assertEqual(["states.shp"], ZipFile(bundle).namelist())
+      # stored, as zipfile wrote them before bundles were streamed
+      self.assertEqual(ZIP_STORED, ZipFile(bundle).getinfo("states.shp").compress_type)
+    finally:
+      os.unlink(bundle)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,298 @@
+import os
+import tempfile
+import threading
+import unittest
+from geoserver.store import UnsavedDataStore
+from geoserver.workspace import Workspace
+from geoserver.cache import CachedResponse, ResponseCache, DiskCache, CachePolicy, \
+    CacheRule, NO_CACHE, url_class, LAYERS, SLD, STORES, WORKSPACES, OTHER
+from test.fakes import fake_catalog, ROOT
+
+def bounded_cache(max_bytes):
+  return ResponseCache(CachePolicy(CacheRule(max_bytes=max_bytes)))
+
+
+class ResponseCacheTests(unittest.TestCase):
+  def testHitReturnsParsedTree(self):
+    cache = bounded_cache(1024)
+    tree = object()
+    cache.put("a", CachedResponse("<a/>", tree))
+    self.assert_(cache.get("a").tree is tree)
+    self.assertEqual(None, cache.get("b"))
+
+  def testEvictsLeastRecentlyUsed(self):
+    cache = bounded_cache(10)
+    cache.put("a", CachedResponse("aaaa", None))
+    cache.put("b", CachedResponse("bbbb", None))
+    cache.get("a")
+    cache.put("c", CachedResponse("cccc", None))
+    self.assert_("a" in cache)
+    self.assert_("b" not in cache)
+    self.assert_("c" in cache)
+    self.assertEqual(8, cache.size)
+
+  def testOversizedEntriesAreNotStored(self):
+    cache = bounded_cache(3)
+    cache.put("a", CachedResponse("aaaa", None))
+    self.assertEqual(0, len(cache))
+    self.assertEqual(0, cache.size)
+
+  def testInvalidateByUrlAndPrefix(self):
+    cache = bounded_cache(1024)
+    for url in ["ws.xml", "ws/a.xml", "ws/a/ft.xml", "ws/ab.xml", "layers.xml"]:
+      cache.put(url, CachedResponse("<x/>", None))
+    cache.invalidate(["ws.xml"], ["ws/a.", "ws/a/"])
+    self.assertEqual(2, len(cache))
+    self.assert_("ws/ab.xml" in cache)
+    self.assert_("layers.xml" in cache)
+    self.assertEqual(8, cache.size)
+
+  def testRevalidationKeepsTree(self):
+    tree = object()
+    entry = CachedResponse("<a/>", tree, etag='"1"', last_modified="yesterday")
+    self.assertEqual({"If-None-Match": '"1"', "If-Modified-Since": "yesterday"},
+        entry.conditional_headers())
+    fresh = entry.revalidated(etag='"2"')
+    self.assert_(fresh.tree is tree)
+    self.assertEqual('"2"', fresh.etag)
+    self.assertEqual("yesterday", fresh.last_modified)
+    self.assertEqual(entry.digest, CachedResponse("<a/>", None).digest)
+    self.assertEqual({}, CachedResponse("<a/>", None).conditional_headers())
+
+  def testUrlClasses(self):
+    rest = "http://localhost:8080/geoserver/rest"
+    self.assertEqual(WORKSPACES, url_class(rest + "/workspaces.xml"))
+    self.assertEqual(WORKSPACES, url_class(rest + "/workspaces/topp.xml"))
+    self.assertEqual(STORES, url_class(rest + "/workspaces/topp/datastores.xml"))
+    self.assertEqual(LAYERS, url_class(rest + "/layers/states.xml"))
+    self.assertEqual(SLD, url_class(rest + "/styles/point.sld"))
+    self.assertEqual(OTHER, url_class(rest + "/about/version.xml"))
+
+  def testPolicyGivesClassesTheirOwnBudget(self):
+    rest = "http://localhost:8080/geoserver/rest"
+    cache = ResponseCache(CachePolicy(CacheRule(max_bytes=4), sld=NO_CACHE,
+        workspaces=CacheRule(max_age=600, max_bytes=8)))
+    cache.put(rest + "/styles/point.sld", CachedResponse("<a/>", None))
+    cache.put(rest + "/workspaces.xml", CachedResponse("<ws/>", None))
+    cache.put(rest + "/layers.xml", CachedResponse("<l/>", None))
+    cache.put(rest + "/styles.xml", CachedResponse("<s/>", None))
+    self.assert_(rest + "/styles/point.sld" not in cache)
+    self.assert_(rest + "/workspaces.xml" in cache)
+    self.assert_(rest + "/layers.xml" not in cache)
+    self.assert_(rest + "/styles.xml" in cache)
+    self.assertEqual(600, cache.rule(rest + "/workspaces/sf.xml").max_age.seconds)
+    self.assertRaises(ValueError, lambda: CachePolicy(featuretypes=NO_CACHE))
+
+  def testDerivedValuesFollowTheirSources(self):
+    cache = bounded_cache(1024)
+    cache.put_derived("index", STORES, {"a": 1}, ["ws.xml", "ws/a/ds.xml"])
+    self.assertEqual({"a": 1}, cache.get_derived("index", STORES))
+    cache.put("ws.xml", CachedResponse("<ws/>", None), changed=False)
+    self.assertEqual({"a": 1}, cache.get_derived("index", STORES))
+    cache.put("ws.xml", CachedResponse("<ws2/>", None))
+    self.assertEqual(None, cache.get_derived("index", STORES))
+
+    cache.put_derived("index", STORES, {"a": 1}, ["ws.xml", "ws/a/ds.xml"])
+    cache.invalidate([], ["ws/a/"])
+    self.assertEqual(None, cache.get_derived("index", STORES))
+
+    cache = ResponseCache(CachePolicy(stores=CacheRule(max_age=0)))
+    cache.put_derived("index", STORES, {"a": 1}, ["ws.xml"])
+    self.assertEqual(None, cache.get_derived("index", STORES))
+
+  def testStaleResponsesAreNotCachedAfterInvalidation(self):
+    cache = bounded_cache(1024)
+    generation = cache.generation
+    cache.invalidate(["ws.xml"])
+    cache.put("ws.xml", CachedResponse("<ws/>", None), generation=generation)
+    cache.put_derived("index", STORES, {}, ["ws.xml"], generation)
+    self.assert_("ws.xml" not in cache)
+    self.assertEqual(None, cache.get_derived("index", STORES))
+    cache.put("ws.xml", CachedResponse("<ws/>", None), generation=cache.generation)
+    self.assert_("ws.xml" in cache)
+
+  def testConcurrentWritersKeepSizeBounded(self):
+    cache = bounded_cache(400)
+    def work(n):
+      for i in range(200):
+        url = "ws/%d.xml" % ((n * 7 + i) % 50)
+        cache.put(url, CachedResponse("x" * 10, None))
+        cache.get(url)
+        if i % 20 == 0:
+          cache.invalidate(prefixes=["ws/1"])
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    self.assert_(cache.size <= 400)
+    self.assertEqual(10 * len(cache), cache.size)
+
+  def testDiskCacheSurvivesNewCache(self):
+    handle, path = tempfile.mkstemp()
+    os.close(handle)
+    try:
+      rest = "http://localhost:8080/geoserver/rest"
+      cache = ResponseCache(disk=DiskCache(path))
+      cache.put(rest + "/workspaces.xml", CachedResponse("<ws/>", None, etag='"1"'))
+      cache.put(rest + "/workspaces/topp.xml", CachedResponse("<topp/>", None))
+
+      reloaded = ResponseCache(disk=DiskCache(path))
+      self.assertEqual(None, reloaded.get(rest + "/workspaces.xml"))
+      entry = reloaded.load(rest + "/workspaces.xml")
+      self.assertEqual("<ws/>", entry.content)
+      self.assertEqual('"1"', entry.etag)
+      self.assertEqual(None, entry.tree)
+
+      reloaded.invalidate([], [rest + "/workspaces/"])
+      self.assertEqual(None, cache.load(rest + "/workspaces/topp.xml"))
+      self.assert_(cache.load(rest + "/workspaces.xml") is not None)
+    finally:
+      os.unlink(path)
+
+class CatalogWalkTests(unittest.TestCase):
+  def testWarmLookupsDontWaitOnThreads(self):
+    cat = fake_catalog({
+      ROOT + "/workspaces/topp/datastores.xml":
+        "<dataStores><dataStore><name>ds</name></dataStore></dataStores>",
+      ROOT + "/workspaces/topp/coveragestores.xml": "<coverageStores/>"})
+    ws = Workspace(cat, "topp")
+    cat.get_store("ds", ws)
+    for i in range(10):
+      self.assertEqual("ds", cat.get_store("ds", ws).name)
+      self.assertEqual(1, len(cat.get_stores(ws)))
+    self.assertEqual(2, len(cat.http.gets()))
+    # two listings are fetched inline, without starting the walk pool
+    self.assertEqual(None, cat._walk_pool)
+
+  def testWalksShareOnePool(self):
+    urls = ["%s/doc%d.xml" % (ROOT, i) for i in range(5)]
+    cat = fake_catalog(dict((url, "<doc/>") for url in urls))
+    cat._map(cat.get_xml, urls)
+    pool = cat._walk_pool
+    self.assert_(pool is not None)
+    # nested walks run on the walk's own threads rather than the pool
+    nested = cat._map(lambda url: cat._map(cat.get_xml, urls), urls)
+    self.assertEqual(5, len(nested))
+    self.assert_(cat._walk_pool is pool)
+    threads = threading.active_count()
+    cat.close()
+    self.assertEqual(None, cat._walk_pool)
+    self.assert_(threading.active_count() < threads)
+
+class GetXmlTests(unittest.TestCase):
+  url = ROOT + "/workspaces.xml"
+
+  def catalog(self, document, **kwargs):
+    # every response is revalidated, so each get_xml makes a request
+    return fake_catalog({self.url: document},
+        cache_policy=CachePolicy(CacheRule(max_age=0)), **kwargs)
+
+  def testNotModifiedReusesTree(self):
+    cat = self.catalog(("<workspaces/>", '"v1"'))
+    tree = cat.get_xml(self.url)
+    self.assert_(cat.get_xml(self.url) is tree)
+    method, url, headers = cat.http.requests[-1]
+    self.assertEqual('"v1"', headers["If-None-Match"])
+
+    cat.http.documents[self.url] = ("<workspaces><workspace/></workspaces>", '"v2"')
+    self.assertEqual(1, len(cat.get_xml(self.url)))
+
+  def testUnchangedBodyWithoutValidatorsReusesTree(self):
+    cat = self.catalog("<workspaces/>")
+    tree = cat.get_xml(self.url)
+    self.assert_(cat.get_xml(self.url) is tree)
+    self.assertEqual(2, len(cat.http.requests))
+    cat.http.documents[self.url] = "<workspaces><workspace/></workspaces>"
+    self.assert_(cat.get_xml(self.url) is not tree)
+
+  def testDiskEntriesAreRevalidated(self):
+    handle, path = tempfile.mkstemp()
+    os.close(handle)
+    try:
+      disk = DiskCache(path)
+      disk.put(self.url, CachedResponse("<workspaces><workspace/></workspaces>",
+          None, '"v1"'))
+      cat = self.catalog(("<workspaces/>", '"v1"'), disk_cache=disk)
+      # a 304 for the entry on disk: its own body is parsed and used
+      self.assertEqual(1, len(cat.get_xml(self.url)))
+      method, url, headers = cat.http.requests[0]
+      self.assertEqual('"v1"', headers["If-None-Match"])
+    finally:
+      os.unlink(path)
+
+  def testResponsesFetchedAcrossAWriteAreNotCached(self):
+    cat = fake_catalog({self.url: "<workspaces/>"})
+    cat.http.on_request = lambda method, url: cat._invalidate(ROOT + "/workspaces/topp.xml")
+    self.assertEqual(0, len(cat.get_xml(self.url)))
+    self.assertEqual(None, cat._cache.get(self.url))
+    cat.http.on_request = None
+    cat.get_xml(self.url)
+    self.assert_(cat._cache.get(self.url) is not None)
+
+class InvalidationTests(unittest.TestCase):
+  def setUp(self):
+    self.cat = fake_catalog()
+    self.indexes = [ROOT + "/layers.xml", ROOT + "/layergroups.xml"]
+
+  def testWriteEvictsObjectItsChildrenAndListing(self):
+    urls, prefixes = self.cat._affected_by(ROOT + "/workspaces/topp/datastores/states.xml")
+    self.assertEqual([ROOT + "/workspaces/topp/datastores.xml"] + self.indexes, urls)
+    self.assertEqual([ROOT + "/workspaces/topp/datastores/states.",
+        ROOT + "/workspaces/topp/datastores/states/"], prefixes)
+
+  def testUnsavedObjectsAreEvictedByName(self):
+    store = UnsavedDataStore(self.cat, "states", Workspace(self.cat, "topp"))
+    urls, prefixes = self.cat._affected_by(store.href)
+    self.assertEqual(ROOT + "/workspaces/topp/datastores.xml", urls[0])
+    self.assertEqual([ROOT + "/workspaces/topp/datastores/states.",
+        ROOT + "/workspaces/topp/datastores/states/"], prefixes)
+
+  def testDefaultWorkspaceWidensToAllWorkspaces(self):
+    urls, prefixes = self.cat._affected_by(ROOT + "/workspaces/default/datastores/states.xml")
+    self.assert_(ROOT + "/workspaces/" in prefixes)
+    urls, prefixes = self.cat._affected_by(ROOT + "/workspaces/topp/datastores/states.xml")
+    self.assert_(ROOT + "/workspaces/" not in prefixes)
+
+  def testRecursiveDeletesReachLayersAndWorkspaces(self):
+    urls, prefixes = self.cat._affected_by(
+        ROOT + "/workspaces/topp/datastores/states.xml", recurse=True)
+    self.assert_(ROOT + "/layers/" in prefixes)
+    self.assert_(ROOT + "/workspaces/" in prefixes)
+
+    cache = self.cat._cache
+    for url in [ROOT + "/layers/states.xml", ROOT + "/workspaces/sf.xml",
+        ROOT + "/styles.xml"]:
+      cache.put(url, CachedResponse("<x/>", None))
+    self.cat._invalidate(ROOT + "/workspaces/topp/datastores/states.xml", recurse=True)
+    self.assertEqual(None, cache.get(ROOT + "/layers/states.xml"))
+    self.assertEqual(None, cache.get(ROOT + "/workspaces/sf.xml"))
+    self.assert_(cache.get(ROOT + "/styles.xml") is not None)
+
+class SnapshotTests(unittest.TestCase):
+  def setUp(self):
+    self.cat = fake_catalog({
+      ROOT + "/workspaces.xml":
+        "<workspaces><workspace><name>topp</name></workspace></workspaces>",
+      ROOT + "/layers.xml": "<layers/>",
+      ROOT + "/layergroups.xml": "<layerGroups/>",
+      ROOT + "/styles.xml": "<styles/>",
+      ROOT + "/workspaces/topp/datastores.xml": "<dataStores/>",
+      ROOT + "/workspaces/topp/coveragestores.xml": "<coverageStores/>"})
+
+  def testSnapshotIsInstalled(self):
+    snapshot = self.cat.snapshot()
+    self.assert_(self.cat._snapshot is snapshot)
+    self.cat.get_stores(Workspace(self.cat, "topp"))
+    self.assertEqual(6, len(self.cat.http.requests))
+
+  def testSnapshotTakenDuringAWriteIsNotInstalled(self):
+    def write(method, url):
+      if url.endswith("/datastores.xml"):
+        # another thread saves something while the listings are fetched
+        self.cat._invalidate(ROOT + "/workspaces/topp.xml")
+    self.cat.http.on_request = write
+    snapshot = self.cat.snapshot()
+    self.assert_(snapshot is not None)
+    self.assertEqual(None, self.cat._snapshot)
+
+if __name__ == "__main__":
+  unittest.main()
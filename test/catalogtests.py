@@ -1,5 +1,7 @@
 import unittest
 from geoserver.catalog import Catalog, ConflictingDataError, UploadError
+from geoserver.asynccatalog import AsyncCatalog, gather
+from geoserver.ingest import ingest
 from geoserver.support import ResourceInfo
 from geoserver.layergroup import LayerGroup
 from geoserver.util import shapefile_and_friends
@@ -83,6 +85,10 @@ class CatalogTests(unittest.TestCase):
     self.assert_(isinstance(states.resource, ResourceInfo))
     self.assertEqual(set(s.name for s in states.styles), set(['pophatch', 'polygon']))
     self.assertEqual(states.default_style.name, "population")
+    self.assertEqual(["states"],
+        [l.name for l in self.cat.get_layers(resource=states.resource)])
+    self.assert_("states" in [l.name for l in self.cat.get_layers(style="population")])
+    self.assert_("states" in [l.name for l in self.cat.get_layers(style="pophatch")])
 
   def testLayerGroups(self):
     expected = set(["tasmania", "tiger-ny", "spearfish"])
@@ -99,6 +105,28 @@ class CatalogTests(unittest.TestCase):
     self.assertEqual(tas.layers, ['tasmania_state_boundaries', 'tasmania_water_bodies', 'tasmania_roads', 'tasmania_cities'], tas.layers)
     self.assertEqual(tas.styles, [None, None, None, None], tas.styles)
 
+  def testSnapshot(self):
+    snapshot = self.cat.snapshot()
+    self.assertEqual(7, len(snapshot.workspaces))
+    self.assertEqual(9, len(snapshot.stores()))
+    self.assertEqual(19, len(snapshot.resources()))
+    self.assertEqual(5, len(snapshot.resources(workspace="topp")))
+    self.assertEqual(20, len(snapshot.styles))
+    self.assertEqual(2, len(snapshot.stores("topp")))
+    self.assert_(("topp", "states_shapefile", "dataStore") in snapshot.stores("topp"))
+    self.assertEqual(19, len(self.cat.get_resources()))
+    self.cat.drop_snapshot()
+
+  def testAsyncCatalog(self):
+    acat = AsyncCatalog(self.cat, concurrency=4)
+    try:
+      self.assertEqual(7, len(acat.get_workspaces().get()))
+      names = ["states", "sfdem", "bugsites"]
+      resources = gather(acat.map("get_resource", names))
+      self.assertEqual(names, [r.name for r in resources])
+    finally:
+      acat.close()
+
   def testStyles(self):
     self.assertEqual(20, len(self.cat.get_styles()))
     self.assertEqual("population", self.cat.get_style("population").name)
@@ -150,6 +178,19 @@ class ModifyingTests(unittest.TestCase):
     rs = self.cat.get_resource("bugsites")
     self.assertEqual(old_abstract, rs.abstract)
 
+  def testSaveAll(self):
+    resources = self.cat.get_resources(workspace=self.cat.get_workspace("sf"))
+    old_titles = dict((rs.name, rs.title) for rs in resources)
+    for rs in resources:
+      rs.title = "gsconfig %s" % rs.name
+    results = self.cat.save_all(resources)
+    self.assertEqual(len(resources), len(results))
+    self.assert_(all(r.success and r.status == 200 for r in results))
+    for rs in self.cat.get_resources(workspace=self.cat.get_workspace("sf")):
+      self.assertEqual("gsconfig %s" % rs.name, rs.title)
+      rs.title = old_titles[rs.name]
+      self.cat.save(rs)
+
   def testDataStoreCreate(self):
     ds = self.cat.create_datastore("vector_gsconfig")
     ds.connection_parameters.update(
@@ -300,6 +341,19 @@ class ModifyingTests(unittest.TestCase):
     self.cat.delete(lyr)
     self.assert_(self.cat.get_layer("states_test") is None)
 
+  def testIngest(self):
+    sf = self.cat.get_workspace("sf")
+    states = shapefile_and_friends("test/data/states")
+    jobs = [("states_ingest_%d" % i, states, sf) for i in range(3)]
+    jobs.append(("sf", states, sf))
+    results = ingest(self.cat, jobs, max_workers=2, max_bundles=1)
+    self.assertEqual([True, True, True, False], [r.success for r in results])
+    self.assert_(isinstance(results[-1].error, ConflictingDataError))
+    for r in results[:3]:
+      self.assertEqual(201, r.upload.status)
+      self.assert_(self.cat.get_resource(r.name, workspace=sf) is not None)
+      self.cat.delete(self.cat.get_layer(r.name))
+
 
   def testCoverageCreate(self):
     tiffdata = {
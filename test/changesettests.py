@@ -0,0 +1,92 @@
+import unittest
+from geoserver.catalog import Catalog
+from geoserver.changeset import object_key, depends_on, needs_save, \
+    WORKSPACE, STORE, RESOURCE, LAYER, LAYERGROUP
+from geoserver.layer import Layer
+from geoserver.layergroup import UnsavedLayerGroup
+from geoserver.resource import FeatureType
+from geoserver.store import DataStore, UnsavedDataStore
+from geoserver.workspace import Workspace, UnsavedWorkspace
+from test.fakes import fake_catalog, ROOT
+
+class ChangesetTests(unittest.TestCase):
+  def setUp(self):
+    self.cat = Catalog("http://localhost:8080/geoserver/rest")
+
+  def testObjectKeys(self):
+    cat = self.cat
+    ws = UnsavedWorkspace(cat, "topp")
+    store = DataStore(cat, Workspace(cat, "topp"), "states_shapefile")
+    self.assertEqual((WORKSPACE, ("topp",)), object_key(cat, ws))
+    self.assertEqual((STORE, ("topp", "states_shapefile")), object_key(cat, store))
+    self.assertEqual((STORE, ("topp", "new")),
+        object_key(cat, UnsavedDataStore(cat, "new", ws)))
+    self.assertEqual((RESOURCE, ("topp", "states_shapefile", "states")),
+        object_key(cat, FeatureType(cat, ws, store, "states")))
+    self.assertEqual((LAYER, ("states",)), object_key(cat, Layer(cat, "states")))
+    self.assertEqual((LAYERGROUP, ("g",)),
+        object_key(cat, UnsavedLayerGroup(cat, "g", [], [], None)))
+
+  def testDependencies(self):
+    ws = (WORKSPACE, ("topp",))
+    store = (STORE, ("topp", "states_shapefile"))
+    other_store = (STORE, ("sf", "sf"))
+    resource = (RESOURCE, ("topp", "states_shapefile", "states"))
+    layer = (LAYER, ("states",))
+    group = (LAYERGROUP, ("g",))
+    self.assert_(depends_on(store, ws))
+    self.assert_(depends_on(resource, store))
+    self.assert_(depends_on(resource, ws))
+    self.assert_(depends_on(layer, resource))
+    self.assert_(depends_on(group, layer))
+    self.assert_(not depends_on(other_store, ws))
+    self.assert_(not depends_on(ws, store))
+    self.assert_(not depends_on(layer, (RESOURCE, ("topp", "states_shapefile", "roads"))))
+
+class FlushTests(unittest.TestCase):
+  def setUp(self):
+    self.cat = cat = fake_catalog({ROOT + "/workspaces/topp/datastores/states/featuretypes/states.xml":
+        "<featureType><enabled>true</enabled></featureType>"})
+    self.ws = UnsavedWorkspace(cat, "topp")
+    self.store = UnsavedDataStore(cat, "states", self.ws)
+    self.resource = FeatureType(cat, Workspace(cat, "topp"),
+        DataStore(cat, Workspace(cat, "topp"), "states"), "states")
+    self.resource.title = "States"
+    self.layer = Layer(cat, "states")
+    self.layer.enabled = True
+    self.plain = DataStore(cat, Workspace(cat, "topp"), "plain")
+
+  def writes(self):
+    return [(method, url) for method, url, headers in self.cat.http.requests
+        if method != "GET"]
+
+  def testWritesInDependencyOrder(self):
+    changeset = self.cat.changeset()
+    changeset.add(self.layer, self.resource, self.plain, self.store, self.ws)
+    self.assertFalse(needs_save(self.plain))
+    self.plain.dirty["name"] = "plain"
+    self.assertFalse(needs_save(self.plain))
+    results = changeset.flush(max_workers=4)
+    self.assertEqual(4, len(results))
+    self.assert_(all(results))
+    self.assertEqual([
+        ("POST", self.ws.href), ("POST", self.store.href),
+        ("PUT", self.resource.href), ("PUT", self.layer.href)], self.writes())
+    # only the untouched store is left
+    self.assertEqual(1, len(changeset))
+
+  def testSkipsDependentsOfFailures(self):
+    self.cat.http.writes[self.store.href] = 500
+    changeset = self.cat.changeset()
+    changeset.add(self.ws, self.store, self.resource, self.layer)
+    ws, store, resource, layer = changeset.flush()
+    self.assert_(ws.success)
+    self.assertEqual(500, store.status)
+    self.assertEqual(None, resource.status)
+    self.assertEqual(None, layer.status)
+    self.assertEqual([("POST", self.ws.href), ("POST", self.store.href)],
+        self.writes())
+    self.assertEqual(3, len(changeset))
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,84 @@
+"""
+Stand-ins for the network, shared by the offline tests.
+"""
+import socket
+from geoserver.catalog import Catalog
+
+class FakeResponse(dict):
+  def __init__(self, status, headers=None):
+    self.status = status
+    self.update(headers or {})
+
+class FakeServer(object):
+  """
+  Stands in for a catalog's connection pool: answers GETs from documents
+  (url to body, or to (body, etag)), honouring If-None-Match, and every
+  other request with the status in writes (default 200).  Every request
+  made is logged in requests as (method, url, headers).
+  """
+  def __init__(self, documents=None):
+    self.documents = dict(documents or {})
+    self.writes = dict()
+    self.requests = []
+    self.on_request = None
+
+  def gets(self):
+    return [url for method, url, headers in self.requests if method == "GET"]
+
+  def request(self, url, method="GET", body=None, headers=None):
+    headers = headers or {}
+    self.requests.append((method, url, headers))
+    if self.on_request is not None:
+      self.on_request(method, url)
+    if method != "GET":
+      return FakeResponse(self.writes.get(url, 200)), ""
+    if url not in self.documents:
+      return FakeResponse(404), "no such document"
+    document = self.documents[url]
+    if isinstance(document, tuple):
+      body, etag = document
+      if headers.get("If-None-Match") == etag:
+        return FakeResponse(304, {"etag": etag}), ""
+      return FakeResponse(200, {"etag": etag}), body
+    return FakeResponse(200), document
+
+  stream = request
+
+  def close(self):
+    pass
+
+ROOT = "http://localhost/rest"
+
+def fake_catalog(documents=None, **kwargs):
+  cat = Catalog(ROOT, **kwargs)
+  cat.http = FakeServer(documents)
+  return cat
+
+class FakeConnection(object):
+  def close(self):
+    pass
+
+class FakeHttp(object):
+  # statuses to answer with, in turn, before settling on 200
+  script = []
+
+  def __init__(self):
+    self.connections = dict()
+    self.requests = []
+    self.opened = 0
+
+  def request(self, url, method="GET", body=None, headers=None):
+    if url == "broken":
+      raise IOError("connection reset")
+    self.requests.append(url)
+    if not self.connections:
+      self.opened += 1
+      self.connections["localhost"] = FakeConnection()
+    if hasattr(body, "read"):
+      body.read()
+    if self.script:
+      status = self.script.pop(0)
+      if status is None:
+        raise socket.error("connection reset")
+      return (FakeResponse(status), url)
+    return (FakeResponse(200), url)
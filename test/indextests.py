@@ -0,0 +1,46 @@
+import unittest
+from geoserver.index import build_layer_index
+from test.fakes import fake_catalog, ROOT
+
+ATOM = "http://www.w3.org/2005/Atom"
+
+def layer(resource_type, href):
+  return """<layer><resource class="%s"><name>%s</name>
+    <atom:link xmlns:atom="%s" rel="alternate" href="%s"/></resource></layer>""" % (
+      resource_type, href.rsplit("/", 1)[-1][:-len(".xml")], ATOM, href)
+
+class LayerIndexTests(unittest.TestCase):
+  def testSkipsLayersWithoutAResource(self):
+    states = ROOT + "/workspaces/topp/datastores/states/featuretypes/states.xml"
+    cat = fake_catalog({
+      ROOT + "/layers.xml":
+        "<layers><layer><name>states</name></layer><layer><name>relief</name></layer></layers>",
+      ROOT + "/layers/states.xml": layer("featureType", states),
+      ROOT + "/layers/relief.xml": layer("wmsLayer",
+          ROOT + "/workspaces/topp/wmsstores/remote/wmslayers/relief.xml"),
+      ROOT + "/workspaces.xml": "<workspaces/>"})
+    index, sources = build_layer_index(cat)
+    self.assertEqual({("topp", "datastores", "states", "states"): ("states",)}, index)
+    self.assertEqual(3, len(sources))
+
+  def testSkipsLayersWhoseResourceIsAmbiguous(self):
+    documents = {
+      ROOT + "/layers.xml":
+        "<layers><layer><name>roads</name></layer></layers>",
+      # no link to go by: the resource is looked up by name
+      ROOT + "/layers/roads.xml":
+        "<layer><resource class='featureType'><name>roads</name></resource></layer>",
+      ROOT + "/workspaces.xml": "<workspaces>%s</workspaces>" % "".join(
+        "<workspace><name>%s</name></workspace>" % ws for ws in ("topp", "sf"))}
+    for ws in ("topp", "sf"):
+      base = "%s/workspaces/%s/" % (ROOT, ws)
+      documents[base + "datastores.xml"] = \
+        "<dataStores><dataStore><name>streets</name></dataStore></dataStores>"
+      documents[base + "coveragestores.xml"] = "<coverageStores/>"
+      documents[base + "datastores/streets/featuretypes.xml"] = \
+        "<featureTypes><featureType><name>roads</name></featureType></featureTypes>"
+    index, sources = build_layer_index(fake_catalog(documents))
+    self.assertEqual({}, index)
+
+if __name__ == "__main__":
+  unittest.main()
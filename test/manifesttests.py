@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+from StringIO import StringIO
+from geoserver.manifest import UploadManifest
+from test.fakes import fake_catalog, ROOT
+
+class UploadManifestTests(unittest.TestCase):
+  def setUp(self):
+    handle, self.path = tempfile.mkstemp()
+    os.close(handle)
+    os.unlink(self.path)
+
+  def tearDown(self):
+    if os.path.exists(self.path):
+      os.unlink(self.path)
+
+  def testEntriesSurviveReload(self):
+    manifest = UploadManifest(self.path)
+    self.assertEqual(None, manifest.get("sf/sf/states"))
+    manifest.put("sf/sf/states", "abc")
+    manifest.put("sf/sf/roads", "def")
+    manifest.discard("sf/sf/roads")
+    reloaded = UploadManifest(self.path)
+    self.assertEqual("abc", reloaded.get("sf/sf/states"))
+    self.assert_("sf/sf/roads" not in reloaded)
+    self.assertEqual(1, len(reloaded))
+
+  def testUnreadableManifestIsEmpty(self):
+    with open(self.path, "w") as f:
+      f.write("{not json")
+    self.assertEqual(0, len(UploadManifest(self.path)))
+
+  def testUnchangedUploadsOnlyLookAtTheirWorkspace(self):
+    cat = fake_catalog({
+      ROOT + "/workspaces/topp/datastores.xml":
+        "<dataStores><dataStore><name>states</name></dataStore></dataStores>",
+      ROOT + "/workspaces/topp/coveragestores.xml": "<coverageStores/>"},
+      upload_manifest=self.path)
+    data = lambda: {"shp": StringIO("shapes"), "dbf": StringIO("records")}
+    dedup, unchanged = cat._check_upload("topp", "states", "states", data())
+    self.assertFalse(unchanged)
+    cat.upload_manifest.put(*dedup)
+    self.assertEqual(0, len(cat.http.requests))
+
+    self.assert_(cat._check_upload("topp", "states", "states", data())[1])
+    self.assertEqual(2, len(cat.http.gets()))
+    index = {"states": (("topp", "dataStore"),)}
+    self.assert_(cat._check_upload("topp", "states", "states", data(), (), index)[1])
+    self.assertFalse(cat._check_upload("topp", "states", "states", data(), (), {})[1])
+    self.assertEqual(2, len(cat.http.gets()))
+
+if __name__ == "__main__":
+  unittest.main()
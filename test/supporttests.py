@@ -0,0 +1,110 @@
+import unittest
+from xml.etree.ElementTree import XML
+from geoserver.layer import Layer
+from geoserver.store import DataStore, UnsavedDataStore
+from geoserver.support import ResourceInfo, xml_property, key_value_pairs, \
+    object_url, string_list
+from geoserver.workspace import UnsavedWorkspace, Workspace
+
+DOCUMENT = """<featureType>
+  <name>states</name>
+  <keywords><string>a</string><string>b</string></keywords>
+  <store><name>sf</name></store>
+</featureType>"""
+
+class FakeCatalog(object):
+  def __init__(self):
+    self.fetches = 0
+
+  def get_xml(self, url):
+    self.fetches += 1
+    return XML(DOCUMENT)
+
+def count(node):
+  Thing.calls.append(node.tag)
+  return node.text
+
+class Thing(ResourceInfo):
+  href = "thing.xml"
+  calls = []
+
+  def __init__(self, catalog):
+    super(Thing, self).__init__()
+    self.catalog = catalog
+
+  name = xml_property("name", count)
+  store = xml_property("store/name")
+  keywords = xml_property("keywords", string_list)
+  params = xml_property("connectionParameters", key_value_pairs)
+
+class XmlPropertyTests(unittest.TestCase):
+  def setUp(self):
+    Thing.calls = []
+    self.thing = Thing(FakeCatalog())
+
+  def testConvertsOncePerDocument(self):
+    self.assertEqual("states", self.thing.name)
+    self.assertEqual("states", self.thing.name)
+    self.assertEqual(["name"], Thing.calls)
+    self.assertEqual("sf", self.thing.store)
+    self.assertEqual(None, self.thing.params)
+    self.assertEqual(1, self.thing.catalog.fetches)
+
+    self.thing.refresh()
+    self.assertEqual("states", self.thing.name)
+    self.assertEqual(["name", "name"], Thing.calls)
+    self.thing.dom = XML("<featureType><name>counties</name></featureType>")
+    self.assertEqual("counties", self.thing.name)
+    self.assertEqual(None, self.thing.store)
+
+  def testUnsavedChangesComeFirst(self):
+    self.assertEqual("states", self.thing.name)
+    self.thing.name = "counties"
+    self.assertEqual("counties", self.thing.name)
+    self.thing.clear()
+    self.assertEqual("states", self.thing.name)
+
+  def testHandsOutCopies(self):
+    self.thing.keywords.append("c")
+    self.assertEqual(["a", "b"], self.thing.keywords)
+
+class CompactObjectTests(unittest.TestCase):
+  def testListedObjectsHoldOnlyTheirNames(self):
+    layer = Layer(FakeCatalog(), "states")
+    self.assertFalse(hasattr(layer, "__dict__"))
+    self.assertEqual((None, None, None), (layer._dirty, layer._nodes, layer._values))
+    self.assertFalse(layer.modified)
+    layer.enabled = False
+    self.assert_(layer.modified)
+    layer.clear()
+    self.assertEqual(None, layer._dirty)
+
+  def testStoresKeepTheirNamesOutOfDirty(self):
+    catalog = FakeCatalog()
+    store = DataStore(catalog, Workspace(catalog, "topp"), "states")
+    self.assertEqual("states", store.name)
+    self.assertEqual(None, store._dirty)
+    self.assertFalse(store.modified)
+
+  def testUnsavedObjectsStartModified(self):
+    catalog = FakeCatalog()
+    ws = UnsavedWorkspace(catalog, "ws")
+    self.assert_(ws.modified)
+    self.assertEqual("ws", ws.dirty["name"])
+    store = UnsavedDataStore(catalog, "states", ws)
+    self.assertEqual("states", store.dirty["name"])
+
+class ObjectUrlTests(unittest.TestCase):
+  def testSavedAndUnsavedHrefsAgree(self):
+    ws = "http://localhost/rest/workspaces/topp"
+    self.assertEqual(ws, object_url(ws + ".xml"))
+    self.assertEqual(ws + "/datastores/states",
+        object_url(ws + "/datastores/states.xml"))
+    self.assertEqual(ws + "/datastores/states",
+        object_url(ws + "/datastores/?name=states"))
+    # names from the query are taken whole, dots and all
+    self.assertEqual(ws + "/datastores/states.v2",
+        object_url(ws + "/datastores?name=states.v2"))
+
+if __name__ == "__main__":
+  unittest.main()
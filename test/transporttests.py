@@ -0,0 +1,125 @@
+import socket
+import time
+import unittest
+from StringIO import StringIO
+from geoserver.bundle import BundleStream
+from geoserver.catalog import Catalog
+from geoserver.transport import ConnectionPool, MeteredBody, RetryPolicy
+from test.fakes import FakeHttp, FakeResponse
+
+class ConnectionPoolTests(unittest.TestCase):
+  def testReusesIdleConnections(self):
+    pool = ConnectionPool(FakeHttp, size=2)
+    pool.request("a")
+    pool.request("b")
+    self.assertEqual(1, pool.stats["created"])
+    self.assertEqual(1, pool.stats["reused"])
+    http = pool.acquire()
+    self.assertEqual(["a", "b"], http.requests)
+
+  def testDiscardsBrokenAndStaleConnections(self):
+    pool = ConnectionPool(FakeHttp, size=1, idle_timeout=0)
+    self.assertRaises(IOError, lambda: pool.request("broken"))
+    self.assertEqual(1, pool.stats["discarded"])
+    pool.request("a")
+    time.sleep(0.01)
+    pool.request("b")
+    self.assertEqual(3, pool.stats["created"])
+    self.assertEqual(2, pool.stats["discarded"])
+
+class RetryTests(unittest.TestCase):
+  def setUp(self):
+    FakeHttp.script = []
+    self.policy = RetryPolicy(max_attempts=3, backoff=0)
+
+  def testRetriesTransientFailures(self):
+    pool = ConnectionPool(FakeHttp, retry=self.policy)
+    FakeHttp.script = [503, None]
+    response, content = pool.request("a")
+    self.assertEqual(200, response.status)
+    self.assertEqual(3, response.attempts)
+    self.assertEqual(2, pool.stats["retried"])
+
+    FakeHttp.script = [503, 503, 503]
+    response, content = pool.request("a", "PUT", "body")
+    self.assertEqual(503, response.status)
+    self.assertEqual(3, response.attempts)
+
+    FakeHttp.script = [500]
+    self.assertEqual(500, pool.request("a")[0].status)
+
+  def testOnlyRetriesIdempotentRequestsWithReplayableBodies(self):
+    pool = ConnectionPool(FakeHttp, retry=self.policy)
+    FakeHttp.script = [503]
+    self.assertEqual(503, pool.request("a", "POST", "body")[0].status)
+    FakeHttp.script = [None]
+    self.assertRaises(socket.error, lambda: pool.request("a", "PUT", StringIO("body")))
+    self.assertEqual(0, pool.stats["retried"])
+
+    FakeHttp.script = [None, 502]
+    body = MeteredBody.wrap("a", StringIO("body"))
+    response, content = pool.stream("a", "PUT", body, {})
+    self.assertEqual(200, response.status)
+    self.assertEqual(3, body.finish(200).attempts)
+    self.assertEqual(4, body.result.bytes_sent)
+
+  def testBackoffWithJitter(self):
+    policy = RetryPolicy(backoff=1, max_backoff=3, jitter=0.5)
+    for attempt, ceiling in [(1, 1), (2, 2), (3, 3), (4, 3)]:
+      delay = policy.delay(attempt)
+      self.assert_(ceiling / 2.0 <= delay <= ceiling)
+    response = FakeResponse(503)
+    response["retry-after"] = "2"
+    self.assertEqual(2, policy.delay(1, response))
+
+class MeteredBodyTests(unittest.TestCase):
+  def send(self, body):
+    # read the way httplib sends a file-like body
+    sent = []
+    block = body.read(8192)
+    while block:
+      sent.append(block)
+      block = body.read(8192)
+    return "".join(sent)
+
+  def testKnownSizeIsSentAsIs(self):
+    reports = []
+    body = MeteredBody.wrap("u", "x" * 20000, reports.append, bundle_time=0.5)
+    self.assertEqual({"Content-Length": "20000"}, body.headers())
+    self.assertEqual("x" * 20000, self.send(body))
+    result = body.finish(201)
+    self.assertEqual(201, result.status)
+    self.assertEqual(20000, result.bytes_sent)
+    self.assertEqual(0.5, result.bundle_time)
+    self.assert_(result.elapsed >= 0.5)
+    self.assert_(reports[-1] is result)
+
+  def testStringBodiesStartOverWhenResent(self):
+    body = MeteredBody.wrap("u", "x" * 100)
+    self.assertEqual("x" * 100, self.send(body))
+    # as httplib2 does after a reused connection turns out to be closed
+    self.assertEqual("x" * 100, self.send(body))
+    self.assertEqual(100, body.finish(200).bytes_sent)
+    self.assertEqual(2, body.result.attempts)
+
+  def testInMemoryUploadsUsePooledConnections(self):
+    FakeHttp.script = []
+    cat = Catalog("http://localhost/rest")
+    cat.http = ConnectionPool(FakeHttp, size=1)
+    cat._upload("a", "x" * 100, {})
+    cat._upload("b", "x" * 100, {})
+    http = cat.http.acquire()
+    self.assertEqual(1, http.opened)
+    cat.http.release(http)
+    cat._upload("c", BundleStream("states", {"shp": StringIO("shp")}), {})
+    self.assertEqual(2, http.opened)
+
+  def testUnknownSizeIsChunked(self):
+    body = MeteredBody.wrap("u", StringIO("y" * 10000))
+    self.assertEqual({"Transfer-Encoding": "chunked"}, body.headers())
+    self.assertEqual("2000\r\n%s\r\n710\r\n%s\r\n0\r\n\r\n" % ("y" * 8192, "y" * 1808),
+        self.send(body))
+    self.assertEqual(10000, body.finish(200).bytes_sent)
+
+if __name__ == "__main__":
+  unittest.main()